@@ -0,0 +1,404 @@
+"""
+Benchmarks for Ra's own hot paths.
+
+Generates synthetic RAML documents with a given number of resources and
+times:
+
+* ``parse``:        ``ra.raml.parse`` (without the on-disk RAML cache)
+* ``api_init``:     ``APISuite.__init__``, including ``_define_factories``
+* ``collect``:      pytest collection of a generated test module through
+                    ``ResourceScopeCollector`` and ``AutotestCollector``
+* ``validate``:     ``RAMLValidator.validate`` on a small and a large body
+* ``dispatch``:     calling requests through a no-op WSGI app
+
+Results are written as JSON so runs can be compared between versions:
+
+    python benchmarks/bench.py --output before.json
+    ... upgrade ...
+    python benchmarks/bench.py --output after.json --compare before.json
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import gc
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+import simplejson as json
+import six
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import ra  # noqa
+from ra import cache, raml  # noqa
+from ra.dsl import APISuite  # noqa
+from ra.validate import RAMLValidator  # noqa
+
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+ITEM_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema",
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer", "minimum": 0},
+        "name": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["id", "name"],
+}
+
+LIST_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-04/schema",
+    "type": "array",
+    "items": ITEM_SCHEMA,
+}
+
+
+def _schema_lines(schema, indent):
+    return [' ' * indent + line
+            for line in json.dumps(schema, indent=2).splitlines()]
+
+
+def synthetic_raml(resources):
+    """Return a RAML 0.8 document declaring :resources: resources.
+
+    Resources come in collection/item pairs ("/things0", "/things0/{id}"),
+    with GET and POST on collections and GET, PUT and DELETE on items. Every
+    method has a JSON schema for its response, and write methods have an
+    example body.
+    """
+    lines = [
+        '#%RAML 0.8',
+        '---',
+        'title: Benchmark API',
+        'baseUri: http://localhost/api',
+        'mediaType: application/json',
+        '',
+    ]
+    example = '{ "id": 1, "name": "thing", "tags": ["a", "b"] }'
+
+    def method(verb, indent, status, schema, with_body):
+        pad = ' ' * indent
+        block = ['{}{}:'.format(pad, verb)]
+        if with_body:
+            block += [
+                '{}  body:'.format(pad),
+                '{}    application/json:'.format(pad),
+                '{}      example: |'.format(pad),
+                '{}        {}'.format(pad, example),
+            ]
+        block += [
+            '{}  responses:'.format(pad),
+            '{}    {}:'.format(pad, status),
+            '{}      body:'.format(pad),
+            '{}        application/json:'.format(pad),
+            '{}          schema: |'.format(pad),
+        ]
+        block += _schema_lines(schema, indent + 12)
+        return block
+
+    count = 0
+    index = 0
+    while count < resources:
+        lines.append('/things{}:'.format(index))
+        lines += method('get', 2, 200, LIST_SCHEMA, False)
+        lines += method('post', 2, 201, ITEM_SCHEMA, True)
+        count += 1
+        if count < resources:
+            lines += [
+                '  /{id}:',
+                '    uriParameters:',
+                '      id:',
+                '        type: integer',
+                '        example: 1',
+            ]
+            lines += method('get', 4, 200, ITEM_SCHEMA, False)
+            lines += method('put', 4, 200, ITEM_SCHEMA, True)
+            lines += method('delete', 4, 204, ITEM_SCHEMA, False)
+            count += 1
+        index += 1
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_test_module(raml_path, resources):
+    "Return the source of a test module using the DSL on every resource."
+    lines = [
+        'import ra',
+        '',
+        '',
+        'def noop_app(environ, start_response):',
+        '    start_response("200 OK", [("Content-Type", "application/json")])',
+        '    return [b"[]"]',
+        '',
+        '',
+        'api = ra.api({!r}, noop_app)'.format(raml_path),
+        '',
+    ]
+    count = 0
+    index = 0
+    while count < resources:
+        lines += [
+            '@api.resource("/things{}")'.format(index),
+            'def things{}(things):'.format(index),
+            '    @things.get',
+            '    def get(req): pass',
+            '',
+        ]
+        count += 1
+        if count < resources:
+            lines[-1:] = [
+                '    @things.resource("/{id}")',
+                '    def thing(thing):',
+                '        @thing.get',
+                '        def get(req): pass',
+                '',
+            ]
+            count += 1
+        index += 1
+    lines += ['api.autotest()', '']
+    return '\n'.join(lines)
+
+
+def noop_app(environ, start_response):
+    "A WSGI app answering every request with an empty JSON array."
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', '2')])
+    return [b'[]']
+
+
+class Response(object):
+    "The parts of a response ``RAMLValidator`` looks at."
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = json.dumps(body).encode('utf-8')
+        self.headers = {'Content-Type': 'application/json'}
+
+    @property
+    def json(self):
+        return json.loads(self.body)
+
+
+def timed(fn, repeat):
+    """Call :fn: :repeat: times and return the timings in seconds.
+
+    Garbage collection is disabled while timing, like ``timeit`` does.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = timeit.default_timer()
+            fn()
+            timings.append(timeit.default_timer() - start)
+        finally:
+            gc.enable()
+    return timings
+
+
+def summarize(timings, ops=1):
+    timings = sorted(timings)
+    return {
+        'min': timings[0] / ops,
+        'median': timings[len(timings) // 2] / ops,
+        'max': timings[-1] / ops,
+        'runs': len(timings),
+        'ops': ops,
+    }
+
+
+def bench_parse(raml_path, repeat):
+    cache.set_default_dir(None)
+    return summarize(timed(lambda: raml.parse(raml_path), repeat))
+
+
+def bench_api_init(raml_path, repeat):
+    return summarize(timed(lambda: APISuite(raml_path, app=noop_app,
+                                            relative_to=HERE),
+                           repeat))
+
+
+def bench_collect(workdir, raml_path, resources, repeat):
+    """Time ``pytest --collect-only`` on a generated test module, with the
+    Ra plugin loaded. This includes pytest's own startup."""
+    import pytest
+
+    def collect():
+        # a fresh module name each run, so it isn't served from sys.modules
+        collect.run += 1
+        module = os.path.join(workdir, 'test_bench_{}.py'.format(collect.run))
+        with open(module, 'w') as f:
+            f.write(synthetic_test_module(raml_path, resources))
+        output = six.StringIO()
+        stdout, sys.stdout = sys.stdout, output
+        try:
+            code = pytest.main(['--collect-only', '-q',
+                                '-p', 'ra.plugins.pytest_',
+                                '-p', 'no:cacheprovider', '--ra-no-raml-cache',
+                                '-o', 'addopts=', '--rootdir', workdir, module])
+        finally:
+            sys.stdout = stdout
+        if code != 0:
+            errors = [line for line in output.getvalue().splitlines()
+                      if line.startswith('ERROR') or 'Error' in line]
+            raise RuntimeError('pytest collection failed (exit code {}): {}'
+                               .format(code, errors[-1] if errors else ''))
+    collect.run = 0
+    return summarize(timed(collect, repeat))
+
+
+def bench_validate(api, items, repeat, ops):
+    node = api.raml.resources['/things0']['GET']
+    body = [{'id': i, 'name': 'thing {}'.format(i), 'tags': ['a', 'b']}
+            for i in range(items)]
+    resp = Response(200, body)
+
+    def validate():
+        for _ in range(ops):
+            RAMLValidator(resp, node).validate(validate=True)
+    result = summarize(timed(validate, repeat), ops)
+    result['items'] = items
+    result['bytes'] = len(resp.body)
+    return result
+
+
+def bench_dispatch(api, repeat, ops):
+    path = api.path_prefix + '/things0'
+    node = api.raml.resources['/things0']['GET']
+
+    def dispatch():
+        for _ in range(ops):
+            req = api.RequestClass.blank(path, method='GET')
+            req.raml = node
+            req(validate=False)
+    return summarize(timed(dispatch, repeat), ops)
+
+
+def run(sizes, repeat, quiet=False):
+    results = {
+        'meta': {
+            'ra': _version(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'date': datetime.datetime.utcnow().isoformat() + 'Z',
+            'repeat': repeat,
+        },
+        'results': {},
+    }
+    workdir = tempfile.mkdtemp(prefix='ra-bench-')
+    try:
+        for size in sizes:
+            raml_path = os.path.join(workdir, 'api_{}.raml'.format(size))
+            with open(raml_path, 'w') as f:
+                f.write(synthetic_raml(size))
+            # the largest documents take a while to parse; time them once
+            size_repeat = repeat if size < 10000 else 1
+
+            entry = results['results'][str(size)] = {}
+
+            def record(name, fn, *args):
+                try:
+                    entry[name] = fn(*args)
+                except Exception as e:
+                    entry[name] = {'error': '{}: {}'.format(
+                        e.__class__.__name__, e)}
+                if not quiet:
+                    print(_format_line(size, name, entry[name]),
+                          file=sys.stderr)
+
+            record('parse', bench_parse, raml_path, size_repeat)
+            record('api_init', bench_api_init, raml_path, size_repeat)
+            record('collect', bench_collect, workdir, raml_path, size,
+                   size_repeat)
+
+            api = APISuite(raml_path, app=noop_app, relative_to=HERE)
+            record('validate_small', bench_validate, api, 10, repeat, 1000)
+            record('validate_large', bench_validate, api, 10000, repeat, 1)
+            record('dispatch', bench_dispatch, api, repeat, 1000)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline):
+    """Return lines comparing the median timings of :results: against
+    :baseline: (both as returned by ``run``)."""
+    lines = []
+    for size, entries in sorted(results['results'].items(),
+                                key=lambda item: int(item[0])):
+        old_entries = baseline['results'].get(size, {})
+        for name, entry in sorted(entries.items()):
+            old = old_entries.get(name)
+            if not old or 'median' not in old or 'median' not in entry:
+                continue
+            ratio = entry['median'] / old['median'] if old['median'] else 0
+            lines.append('{:>6} {:<16} {:>12} -> {:>12}  x{:.2f}'.format(
+                size, name, _format_time(old['median']),
+                _format_time(entry['median']), ratio))
+    return lines
+
+
+def _version():
+    with open(os.path.join(os.path.dirname(HERE), 'VERSION')) as f:
+        return f.read().strip()
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '{:.3f}{}'.format(seconds * scale, unit)
+    return '{:.3f}ns'.format(seconds * 1e9)
+
+
+def _format_line(size, name, entry):
+    if 'error' in entry:
+        value = 'error ({})'.format(entry['error'].splitlines()[0])
+    else:
+        value = _format_time(entry['median'])
+        if entry['ops'] > 1:
+            value += ' per op'
+    return '{:>6} {:<16} {}'.format(size, name, value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='numbers of resources in the generated RAML '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per benchmark (default: %(default)s)')
+    parser.add_argument('--output', '-o',
+                        help='write JSON results to this file '
+                             '(default: stdout)')
+    parser.add_argument('--compare',
+                        help='JSON results of an earlier run to compare '
+                             'against')
+    parser.add_argument('--quiet', '-q', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, quiet=args.quiet)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,9 @@ RAML to validate responses.
 from .dsl import APISuite
 
 
-def api(raml, app='config:test.ini', relative_to=None, JSONEncoder=None):
+def api(raml, app='config:test.ini', relative_to=None, JSONEncoder=None,
+        engine=None, compact_raml=False, shared=True, json_codec=None,
+        factory_seed=None, isolation=None, generate_bodies=False):
     """The main entry point for Ra.
 
         :param raml:        path to RAML file or RAML in string form
@@ -26,7 +28,39 @@ def api(raml, app='config:test.ini', relative_to=None, JSONEncoder=None):
                             an educated guess.
         :param JSONEncoder: an optional JSONEncoder class to encode data used
                             in request bodies.
+        :param engine:      what test requests are sent through. By default
+                            that's the ``webtest.TestApp`` for :app:. Pass
+                            'asyncio' to send them through a pooled aiohttp
+                            client when :app: is a URL, or an object with a
+                            webtest-like ``request()`` method such as a
+                            configured ``ra.aio.AsyncApp``.
+        :param compact_raml: if True, keep the parsed RAML in Ra's compact
+                            node model (``ra.raml.compact_root``) instead of
+                            wrapping the ramlfications objects, to save
+                            memory on large RAML files.
+        :param shared:      share the parsed RAML and the app loaded from a
+                            config URI or URL with other suites created
+                            with the same arguments in this process
+                            (default True); pass False for a suite that
+                            needs its own (see ``ra.registry``).
+        :param json_codec:  JSON backend for request and response bodies:
+                            None (simplejson), 'auto' (orjson or ujson if
+                            installed), 'orjson', 'ujson' or a
+                            ``ra.codec.JSONCodec``. Request bodies are
+                            encoded with simplejson if a custom
+                            :JSONEncoder: is given.
+        :param factory_seed: seed for the factories generating request
+                            bodies and query parameters from the RAML
+                            schemas (see ``ra.factory.SchemaFactories``).
+        :param generate_bodies: if True, request bodies are generated from
+                            their JSON schema by default instead of copied
+                            from the RAML example.
+        :param isolation:   a ``ra.isolation.Isolation`` (like
+                            ``ra.isolation.SQLAlchemyIsolation``) begun
+                            before each test and rolled back after it.
 
     :return: instance of ``ra.APISuite``, used to define the test suite
     """
-    return APISuite(raml, app, relative_to, JSONEncoder)
+    return APISuite(raml, app, relative_to, JSONEncoder, engine,
+                    compact_raml, shared, json_codec, factory_seed,
+                    isolation, generate_bodies)
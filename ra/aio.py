@@ -0,0 +1,174 @@
+"""
+An asyncio request engine for testing remote servers, using aiohttp.
+
+``AsyncApp`` can stand in for ``webtest.TestApp`` as the app requests are
+made against (see ``ra.request.make_request_class``). Its event loop runs in
+a background thread, so ``req()`` stays synchronous in test bodies, while
+tests can opt in to concurrency with ``req.areq()`` coroutines and
+``AsyncApp.gather``.
+
+Requires Python 3.5+ and aiohttp (``pip install ra[async]``).
+"""
+import asyncio
+import threading
+import weakref
+import webtest
+from . import timing
+from .request import start_timings, validate_response
+
+
+# hop-by-hop and encoding headers that no longer describe the body once
+# aiohttp has read (and decompressed) it
+SKIP_RESPONSE_HEADERS = frozenset(['content-encoding', 'content-length',
+                                   'transfer-encoding', 'connection'])
+
+# engines to close when the test session ends
+_open = weakref.WeakSet()
+
+
+class AsyncApp(object):
+    """Sends requests to the server at :url: through a pooled aiohttp client.
+
+    Connections are kept alive and pooled per host. At most :max_requests:
+    requests are in flight at once (and at most :max_per_host: per host, if
+    given).
+
+    :param url:             base URL of the server; request paths are
+                            appended to it
+    :param max_requests:    cap on concurrent requests
+    :param max_per_host:    cap on concurrent connections per host
+                            (default 0: no per-host cap)
+    :param timeout:         total timeout for each request, in seconds
+    """
+    def __init__(self, url, max_requests=100, max_per_host=0, timeout=300):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("The asyncio request engine requires aiohttp. "
+                              "Please install it with: pip install aiohttp")
+        self._aiohttp = aiohttp
+        self.url = url.rstrip('/')
+        self.max_requests = max_requests
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name='ra-asyncio')
+        self._thread.daemon = True
+        self._thread.start()
+        self._session = None
+        self._semaphore = None
+        _open.add(self)
+
+    def run(self, coro):
+        "Run :coro: on the engine's event loop and wait for its result."
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def gather(self, *coros):
+        """Run coroutines (e.g. several ``req.areq()`` calls) concurrently
+        and return their results in order."""
+        async def _gather():
+            return await asyncio.gather(*coros)
+        return self.run(_gather())
+
+    async def _get_session(self):
+        if self._session is None:
+            aiohttp = self._aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_requests,
+                                             limit_per_host=self.max_per_host)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                auto_decompress=True)
+            self._semaphore = asyncio.Semaphore(self.max_requests)
+        return self._session
+
+    async def arequest(self, req, status=None, expect_errors=False,
+                       **req_params):
+        """Send a webob-like request :req:, applying :req_params: to (a copy
+        of) it first, like ``webtest.TestApp.request``.
+
+        Returns a ``webtest.TestResponse``. Unexpected statuses raise
+        ``webtest.AppError`` unless :expect_errors: is set.
+        """
+        req = req.copy()
+        for name, value in req_params.items():
+            setattr(req, name, value)
+
+        session = await self._get_session()
+        headers = [(name, value) for name, value in req.headers.items()
+                   if name.lower() != 'host']
+        async with self._semaphore:
+            async with session.request(req.method,
+                                       self.url + req.path_qs,
+                                       headers=headers,
+                                       data=req.body or None,
+                                       allow_redirects=False) as resp:
+                body = await resp.read()
+                headerlist = [(str(name), str(value)) for name, value
+                              in resp.headers.items()
+                              if name.lower() not in SKIP_RESPONSE_HEADERS]
+                status_line = '{} {}'.format(resp.status, resp.reason or '')
+
+        res = req.ResponseClass(body=body, status=status_line,
+                                headerlist=headerlist, request=req)
+        res.content_length = len(body)
+        _check_status(res, status, expect_errors)
+        return res
+
+    def request(self, req, **req_params):
+        "Blocking version of ``arequest``, with the same interface as webtest."
+        return self.run(self.arequest(req, **req_params))
+
+    def close(self):
+        """Close pooled connections and stop the event loop. The pytest
+        plugin closes the engines left open when the test session ends."""
+        if self._session is not None:
+            self.run(self._session.close())
+            self._session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        _open.discard(self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.url)
+
+
+def close_all():
+    "Close the engines that are still open (called by the plugin)."
+    for app in list(_open):
+        app.close()
+
+
+def make_areq(app):
+    "Return the ``areq`` coroutine method for requests bound to :app:."
+    async def areq(self, validate=True, **req_params):
+        timings = start_timings(self)
+        resp = None
+        try:
+            start = timing.clock()
+            resp = await app.arequest(self, **req_params)
+            timings['dispatch'] = timing.clock() - start
+            if validate:
+                validate_response(self, resp, validate, timings)
+        finally:
+            timing.record(self, resp, timings)
+        return resp
+    return areq
+
+
+def _check_status(res, status, expect_errors):
+    "Raise ``webtest.AppError`` like ``webtest.TestApp`` does."
+    if status == '*' or expect_errors:
+        return
+    if status is not None:
+        expected = status if isinstance(status, (list, tuple)) else [status]
+        if res.status_int not in expected:
+            raise webtest.AppError("Bad response: {} (not {})\n{}".format(
+                res.status, status, res.request.url))
+        return
+    if not 200 <= res.status_int < 400:
+        raise webtest.AppError(
+            "Bad response: {} (not 200 OK or 3xx redirect for {})\n{}".format(
+                res.status, res.request.url, res.text))
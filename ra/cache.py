@@ -0,0 +1,118 @@
+"""
+This module provides an on-disk cache of parsed RAML.
+
+Entries are keyed by a hash of the root RAML file and every file it
+``!include``s (recursively), so editing any of them invalidates the entry.
+A cached entry is the pickled ``ra.raml.RootNode``, with its resources
+already mapped; compiled schema validators are rebuilt when it's loaded.
+
+Files pulled in through JSON ``$ref``s are not tracked.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import warnings
+from six.moves import cPickle as pickle
+import ramlfications
+
+
+# bump when the pickled node layout changes
+CACHE_VERSION = 4
+
+INCLUDE = re.compile(r'!include\s+([^\s#]+)')
+PARSABLE_EXTENSIONS = ('.raml', '.yaml', '.yml')
+
+_default_dir = None
+
+
+def set_default_dir(directory):
+    """Set the cache directory used when none is passed explicitly
+    (the pytest plugin sets this to a directory in pytest's cache)."""
+    global _default_dir
+    _default_dir = directory
+
+
+def get_default_dir():
+    return _default_dir
+
+
+def raml_files(raml_path):
+    """Return the absolute paths of :raml_path: and every file it includes,
+    in the order they're first encountered."""
+    seen = []
+    pending = [os.path.abspath(raml_path)]
+    while pending:
+        path = pending.pop(0)
+        if path in seen:
+            continue
+        seen.append(path)
+        if not path.endswith(PARSABLE_EXTENSIONS) or not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            text = f.read().decode('utf-8', 'replace')
+        base = os.path.dirname(path)
+        pending.extend(os.path.normpath(os.path.join(base, name))
+                       for name in INCLUDE.findall(text))
+    return seen
+
+
+def cache_key(raml_path):
+    "Hash the contents of :raml_path: and all its included files."
+    digest = hashlib.sha1()
+    digest.update('{}:{}'.format(CACHE_VERSION,
+                                 ramlfications.__version__).encode('utf-8'))
+    for path in raml_files(raml_path):
+        digest.update(path.encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except (IOError, OSError):
+            digest.update(b'<missing>')
+    return digest.hexdigest()
+
+
+def _entry_path(raml_path, cache_dir, variant=None):
+    name = hashlib.sha1(os.path.abspath(raml_path).encode('utf-8'))
+    suffix = '-{}'.format(variant) if variant else ''
+    return os.path.join(cache_dir, name.hexdigest() + suffix + '.pickle')
+
+
+def load(raml_path, cache_dir, key=None, variant=None):
+    """Return the cached ``RootNode`` for :raml_path:, or None if there is
+    no entry or it is stale.
+
+    :param variant:     name of the node model, if not the default one
+                        (e.g. "compact"); each is cached separately
+    """
+    if key is None:
+        key = cache_key(raml_path)
+    try:
+        with open(_entry_path(raml_path, cache_dir, variant), 'rb') as f:
+            cached_key, root = pickle.load(f)
+    except Exception:
+        return None
+    if cached_key != key:
+        return None
+    return root
+
+
+def dump(root, raml_path, cache_dir, key=None, variant=None):
+    """Store :root: as the cache entry for :raml_path:. Failures only
+    produce a warning."""
+    if key is None:
+        key = cache_key(raml_path)
+    tmp_path = None
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((key, root), f, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(
+            tmp_path, _entry_path(raml_path, cache_dir, variant))
+    except Exception as ex:
+        warnings.warn("Could not cache parsed RAML {}: {}".format(raml_path,
+                                                                   ex))
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,275 @@
+"""
+Batched generated test cases.
+
+A resource scope test declared with ``cases=N`` runs its test function N
+times within a single test item, sending a different generated body and
+query string through the same ``req`` each time. Bodies come from the
+request's schema factory (or its custom factory) and query strings from the
+route's query parameters (see ``ra.factory``).
+
+The first failing case is shrunk to a minimal counterexample: parts of the
+case are removed or made smaller, and kept whenever the test still fails
+with the same error and the case is still valid against its schema. The
+counterexample is reported with the seed that reproduces the run.
+"""
+import collections
+import functools
+import random
+import warnings
+import six
+import simplejson as json
+from six.moves.urllib.parse import parse_qsl, urlencode
+
+from .factory import SchemaFactory
+from .raml import compile_schema
+
+
+Case = collections.namedtuple('Case', 'index data query')
+Case.__doc__ = """A generated case: its index in the run, the request data
+(None if the request has no generated body) and the generated query
+parameters (a dict)."""
+
+# test function re-runs allowed while shrinking a failing case
+MAX_SHRINKS = 500
+
+
+class CaseFailure(AssertionError):
+    "Raised when a generated case fails, with its minimal counterexample."
+
+
+class CaseRunner(object):
+    """Runs the test function of :builder: (a ``ra.dsl.RequestBuilder``)
+    with :cases: generated cases.
+
+    :param seed:        seed for generating the cases; a random one is
+                        picked (and reported on failure) by default
+    :param max_shrinks: how many times the test function may be re-run to
+                        shrink a failing case
+    :param schema_factory: the ``SchemaFactory`` for request bodies, used
+                        unless the builder's factory is one
+
+    Bodies are generated from a schema, or by a custom factory. Without
+    either, the builder's body is sent with every case (with a warning if
+    it's the RAML example), and only query strings are generated; if the
+    route has no query parameters either, ``ValueError`` is raised.
+    """
+    def __init__(self, builder, cases, seed=None, max_shrinks=MAX_SHRINKS,
+                 schema_factory=None):
+        self.builder = builder
+        self.cases = cases
+        self.seed = seed
+        self.max_shrinks = max_shrinks
+
+        api = builder.scope.api
+        self.endpoint = '{} {}'.format(builder.verb.upper(),
+                                       builder.scope.path)
+        self.body_schema = None
+        self.body_factory = None
+        example = False
+        if builder.body is None and builder.data is None:
+            if isinstance(builder.factory, SchemaFactory):
+                self.body_schema = builder.factory.schema
+            elif schema_factory is not None:
+                self.body_schema = schema_factory.schema
+            elif _is_example_factory(api, builder.factory):
+                # every case would send the same example body
+                example = True
+            else:
+                self.body_factory = builder.factory
+        self.query_schema = api.query_factories.schemas.get(self.endpoint)
+        self.fixed_query = parse_qsl(builder.query_string or '')
+
+        if (self.body_schema is None and self.body_factory is None and
+                self.query_schema is None):
+            raise ValueError("No request body schema, factory or query "
+                             "parameters to generate cases from for "
+                             "{}".format(self.endpoint))
+        if example:
+            warnings.warn("No request body schema to generate cases from for "
+                          "{}: every case sends the example body".format(
+                              self.endpoint))
+
+    def generate(self, seed):
+        "Yield the generated cases for :seed:."
+        body = query = None
+        if self.body_schema is not None:
+            body = SchemaFactory(self.body_schema,
+                                 seed='{}:body'.format(seed))
+        if self.query_schema is not None:
+            query = SchemaFactory(self.query_schema,
+                                  seed='{}:query'.format(seed))
+        for index in range(self.cases):
+            if body is not None:
+                data = body()
+            elif self.body_factory is not None:
+                data = self.body_factory()
+            else:
+                data = None
+            yield Case(index, data, query() if query is not None else {})
+
+    def apply(self, req, case):
+        "Set the body and query string of :req: for :case:."
+        req.case = case
+        if case.data is not None:
+            req.data = case.data
+            req.encode_data()
+        req.query_string = self.query_string(case.query)
+
+    def query_string(self, query):
+        "Encode generated :query: parameters, with the declared ones."
+        declared = set(name for name, _ in self.fixed_query)
+        params = [(name, _query_value(value))
+                  for name, value in sorted(six.iteritems(query))
+                  if name not in declared]
+        return urlencode(params + self.fixed_query, doseq=True)
+
+    def run(self, test_fn, kwargs):
+        """Call :test_fn: with fixture values :kwargs: for each case, raising
+        ``CaseFailure`` on the first one that fails."""
+        seed = self.seed
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        req = self.builder.build()
+        for case in self.generate(seed):
+            error = self._try(test_fn, req, case, kwargs)
+            if error is not None:
+                self.fail(test_fn, req, case, error, kwargs, seed)
+
+    def _try(self, test_fn, req, case, kwargs):
+        self.apply(req, case)
+        try:
+            test_fn(**kwargs)
+        except Exception as e:
+            return e
+        return None
+
+    def fail(self, test_fn, req, case, error, kwargs, seed):
+        "Shrink failing :case: and raise ``CaseFailure``."
+        original = case
+        case, error, steps = self.shrink(test_fn, req, case, error, kwargs)
+        self.apply(req, case)
+        lines = ['{} failed on case {} of {} (seed {})'.format(
+            self.endpoint, original.index + 1, self.cases, seed)]
+        if steps:
+            lines[0] += ', shrunk in {} steps'.format(steps)
+        if case.data is not None:
+            lines.append('  body: {}'.format(json.dumps(case.data,
+                                                        sort_keys=True)))
+        if case.query:
+            lines.append('  query: {}'.format(self.query_string(case.query)))
+        lines.append('{}: {}'.format(type(error).__name__, error))
+        six.raise_from(CaseFailure('\n'.join(lines)), error)
+
+    def shrink(self, test_fn, req, case, error, kwargs):
+        """Return the smallest variant of failing :case: found that still
+        fails with the same type of error, that error and the number of
+        shrinking steps taken."""
+        body_valid = _validity_check(self.body_schema)
+        query_valid = _validity_check(self.query_schema)
+        runs = steps = 0
+        improved = True
+        while improved and runs < self.max_shrinks:
+            improved = False
+            for candidate in self._candidates(case, body_valid, query_valid):
+                if runs >= self.max_shrinks:
+                    break
+                runs += 1
+                candidate_error = self._try(test_fn, req, candidate, kwargs)
+                if type(candidate_error) is type(error):
+                    case, error = candidate, candidate_error
+                    steps += 1
+                    improved = True
+                    break
+        return case, error, steps
+
+    def _candidates(self, case, body_valid, query_valid):
+        if case.data is not None and body_valid is not None:
+            for data in shrink_value(case.data):
+                if body_valid(data):
+                    yield case._replace(data=data)
+        if case.query and query_valid is not None:
+            for query in shrink_value(case.query):
+                if query_valid(query):
+                    yield case._replace(query=query)
+
+
+def _is_example_factory(api, factory):
+    return factory is not None and any(
+        factory is example for example in api.examples.factories.values())
+
+
+def _validity_check(schema):
+    if schema is None:
+        return None
+    try:
+        return compile_schema(schema).is_valid
+    except Exception:
+        # can't tell smaller cases are still valid: don't shrink them
+        return None
+
+
+def _query_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def shrink_value(value):
+    """Yield smaller variants of JSON value :value:, simplest first: objects
+    lose keys, arrays lose items, strings get shorter and numbers move
+    toward zero, then the parts of objects and arrays are shrunk."""
+    if isinstance(value, dict):
+        for key in sorted(value):
+            yield dict((k, v) for k, v in six.iteritems(value) if k != key)
+        for key in sorted(value):
+            for smaller in shrink_value(value[key]):
+                yield dict(value, **{key: smaller})
+    elif isinstance(value, list):
+        if value:
+            yield []
+        for index in range(len(value)):
+            yield value[:index] + value[index + 1:]
+        for index, item in enumerate(value):
+            for smaller in shrink_value(item):
+                yield value[:index] + [smaller] + value[index + 1:]
+    elif isinstance(value, bool):
+        if value:
+            yield False
+    elif isinstance(value, six.string_types):
+        if value:
+            yield value[:0]
+        if len(value) > 2:
+            yield value[:len(value) // 2]
+        if len(value) > 1:
+            yield value[:-1]
+    elif isinstance(value, six.integer_types + (float,)):
+        for smaller in _shrink_number(value):
+            yield smaller
+
+
+def _shrink_number(value):
+    if value == 0:
+        return []
+    candidates = [0, int(value / 2), int(value) - 1 if value > 0
+                  else int(value) + 1]
+    if isinstance(value, float) and not value.is_integer():
+        candidates.append(float(int(value)))
+    smaller = []
+    for candidate in candidates:
+        if abs(candidate) < abs(value) and candidate not in smaller:
+            smaller.append(candidate)
+    return smaller
+
+
+def run_cases(test_fn, runner):
+    """Wrap :test_fn: so the generated cases of :runner: (a ``CaseRunner``)
+    run when it is called. The wrapper takes the same fixtures."""
+    @functools.wraps(test_fn)
+    def wrapper(**kwargs):
+        try:
+            runner.run(test_fn, kwargs)
+        finally:
+            if 'req' not in kwargs:
+                runner.builder.release()
+    wrapper.__wrapped__ = test_fn
+    return wrapper
@@ -0,0 +1,137 @@
+"""
+JSON codecs for encoding request bodies and decoding response bodies.
+
+The default codec uses simplejson, like earlier versions of Ra. Faster
+backends (orjson, ujson) can be selected with the ``json_codec`` argument
+of ``ra.api()``, by name or with "auto" for the fastest one installed. They
+encode straight to bytes.
+
+When a custom ``JSONEncoder`` class is given, request bodies are still
+encoded with simplejson so the encoder is used; responses are decoded with
+the selected backend.
+"""
+import simplejson as json
+
+
+class JSONCodec(object):
+    "Base class for codecs: ``dumps`` returns bytes, ``loads`` takes bytes."
+    name = None
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.name)
+
+
+class SimpleJSONCodec(JSONCodec):
+    name = 'simplejson'
+
+    def __init__(self, JSONEncoder=None):
+        self.JSONEncoder = JSONEncoder or json.JSONEncoder
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=self.JSONEncoder).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrJSONCodec(JSONCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+        self.loads = orjson.loads
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return self._dumps(obj, option=self._options)
+
+
+class UJSONCodec(JSONCodec):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._dumps = ujson.dumps
+        self.loads = ujson.loads
+
+    def dumps(self, obj):
+        return self._dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+class EncoderFallbackCodec(JSONCodec):
+    """Encodes with simplejson and a custom :JSONEncoder:, and decodes with
+    the :decoder: codec."""
+    def __init__(self, decoder, JSONEncoder):
+        self.name = '{}+simplejson'.format(decoder.name)
+        self.decoder = decoder
+        self.encoder = SimpleJSONCodec(JSONEncoder)
+        self.dumps = self.encoder.dumps
+        self.loads = decoder.loads
+
+
+CODECS = {
+    'simplejson': SimpleJSONCodec,
+    'orjson': OrJSONCodec,
+    'ujson': UJSONCodec,
+}
+
+# tried in this order for "auto"
+FAST_CODECS = ('orjson', 'ujson')
+
+
+def get_codec(codec=None, JSONEncoder=None):
+    """Return the codec for :codec:, which is None (simplejson), "auto"
+    (the fastest installed backend), the name of a backend in ``CODECS``, or
+    a ``JSONCodec`` instance.
+
+    If a custom :JSONEncoder: class is given, the codec encodes with it
+    through simplejson.
+    """
+    if codec is None or codec == 'simplejson':
+        return SimpleJSONCodec(JSONEncoder)
+    if isinstance(codec, JSONCodec):
+        selected = codec
+    elif codec == 'auto':
+        selected = None
+        for name in FAST_CODECS:
+            try:
+                selected = CODECS[name]()
+            except ImportError:
+                continue
+            break
+        if selected is None:
+            return SimpleJSONCodec(JSONEncoder)
+    else:
+        try:
+            cls = CODECS[codec]
+        except KeyError:
+            raise ValueError("Unknown JSON codec {!r}, expected one of: "
+                             "auto, {}".format(codec,
+                                               ', '.join(sorted(CODECS))))
+        selected = cls()
+    if JSONEncoder is not None and not isinstance(selected, SimpleJSONCodec):
+        return EncoderFallbackCodec(selected, JSONEncoder)
+    return selected
+
+
+def make_response_class(base, codec):
+    "Return a subclass of response class :base: decoding JSON with :codec:."
+    def json(self):
+        """Return the response as a JSON response.
+        The content type must be one of json type to use this.
+        """
+        if not self.content_type.endswith(('+json', '/json')):
+            raise AttributeError(
+                "Not a JSON response body (content-type: %s)"
+                % self.content_type)
+        return codec.loads(self.body)
+
+    return type(base.__name__, (base,), {'json': property(json),
+                                         'json_codec': codec})
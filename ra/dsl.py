@@ -1,11 +1,15 @@
+import collections
 import os
+import time
 import warnings
+import pytest
 import six
 import simplejson as json
 import webtest
 
-from . import raml, marks
-from .factory import Examples
+from . import (cases, codec, raml, marks, parallel, readiness, registry,
+               timing)
+from .factory import Examples, SchemaFactories, named_params_schema
 from .request import make_request_class
 from .utils import (
     path_from_uri,
@@ -21,14 +25,35 @@ class APISuite(object):
     """
 
     def __init__(self, raml_path_or_string, app='config:test.ini',
-                 relative_to=None, JSONEncoder=None):
-        """Instantiates an API test suite for the given :raml: and :app:."""
+                 relative_to=None, JSONEncoder=None, engine=None,
+                 compact_raml=False, shared=True, json_codec=None,
+                 factory_seed=None, isolation=None,
+                 generate_bodies=False):
+        """Instantiates an API test suite for the given :raml: and :app:.
+
+        Unless :shared: is False, the parsed RAML and the app (when given
+        as a config URI or URL) are shared with other suites created with
+        the same arguments (see ``ra.registry``).
+
+        :json_codec: selects the JSON backend for request and response
+        bodies (see ``ra.codec.get_codec``).
+
+        :factory_seed: seeds the schema factories (see
+        ``ra.factory.SchemaFactories``). If :generate_bodies: is True, they
+        are the default body factories instead of the example factories.
+
+        :isolation: a ``ra.isolation.Isolation`` begun before each test of
+        the suite and rolled back after it.
+        """
+        url = app if isinstance(app, six.string_types) else None
 
         if relative_to is None:
             relative_to = guess_rootdir()
 
         if isinstance(app, webtest.TestApp):
             app = app
+        elif shared and url is not None:
+            app = registry.get_app(url, relative_to)
         else:
             app = webtest.TestApp(app, relative_to=relative_to)
         self.app = app
@@ -37,17 +62,45 @@ class APISuite(object):
             raml_path_or_string = os.path.normpath(
                 os.path.join(relative_to, raml_path_or_string))
 
-        self.raml_path, self.raml = _parse_raml(raml_path_or_string)
+        self.raml_path, self.raml = _parse_raml(raml_path_or_string,
+                                                compact=compact_raml,
+                                                shared=shared)
         self.path_prefix = path_from_uri(self.raml.base_uri)
         self.resource_scopes = []
 
         self.test_suite = TestSuite()
 
-        self.RequestClass = make_request_class(app)
+        if engine == 'asyncio':
+            if url is None or not url.startswith('http'):
+                raise ValueError("The asyncio engine needs app to be a URL")
+            from .aio import AsyncApp
+            engine = AsyncApp(url)
+        self.engine = engine
 
         self.JSONEncoder = JSONEncoder or json.JSONEncoder
+        self.json_codec = codec.get_codec(json_codec, JSONEncoder)
+
+        self.RequestClass = make_request_class(engine or app,
+                                               json_codec=self.json_codec)
 
+        self.generate_bodies = generate_bodies
+        self.schema_factories = SchemaFactories(seed=factory_seed)
+        self.query_factories = SchemaFactories(seed=factory_seed)
         self.examples = self._define_factories()
+        self.isolation = isolation
+
+    def begin_test(self, builder):
+        """Called by the pytest plugin before the test of :builder: (a
+        ``RequestBuilder``) and its function-scoped fixtures are set up;
+        begins the isolation, if any."""
+        if self.isolation is not None:
+            self.isolation.begin(builder)
+
+    def rollback_test(self, builder):
+        """Called by the pytest plugin after the test of :builder: has
+        been torn down; rolls back the isolation, if any."""
+        if self.isolation is not None:
+            self.isolation.rollback(builder)
 
     def _define_factories(self):
         """Create factories for example body values.
@@ -56,20 +109,29 @@ class APISuite(object):
         stored for each route with an example declared. The POST body
         factory for each collection is also keyed by resource name,
         e.g. "POST /users/{username}/profile" is also keyed as "user.profile".
+
+        Request body JSON schemas are registered the same way in
+        ``self.schema_factories``, and the query parameters of each route
+        in ``self.query_factories``.
         """
         examples = Examples()
         for path, nodes in six.iteritems(self.raml.resources):
             for method, node in six.iteritems(nodes):
+                route = "{} {}".format(method, path)
+                if node.query_params:
+                    self.query_factories.make_factory(
+                        route, named_params_schema(node.query_params))
                 try:
-                    example = node.body['application/json'].example
+                    body = node.body['application/json']
                 except KeyError:
                     continue
-                else:
-                    route = "{} {}".format(method, path)
-                    examples.make_factory(route, example)
-                    if method == 'POST':
-                        resource_name = raml.resource_name_from_path(path)
-                        examples.make_factory(resource_name, example)
+                names = [route]
+                if method == 'POST':
+                    names.append(self.raml.resource_names.name(path))
+                for name in names:
+                    examples.make_factory(name, body.example)
+                    if isinstance(body.schema, dict):
+                        self.schema_factories.make_factory(name, body.schema)
         return examples
 
     def resource(self, path, factory=None, parent=None, **uri_params):
@@ -99,7 +161,7 @@ class APISuite(object):
         if full_path in self.raml.resources:
             # get URI param example values:
             res = list(self.raml.resources[full_path].values())[0]
-            uri_args = raml.uri_args_from_example(res)
+            uri_args = dict(res.path_builder.defaults)
             uri_args.update(uri_params)
         else:
             warnings.warn("Declaring resource scope {}: resource not declared "
@@ -111,6 +173,8 @@ class APISuite(object):
                                   factory=factory, parent=parent,
                                   **uri_args)
             self.resource_scopes.append(scope)
+            if parent is not None:
+                parent.register(fn)
 
             # tag this function as a resource scope for the pytest collector
             # and store the argument that will be passed to it when it's called
@@ -148,12 +212,16 @@ class ResourceScope(object):
                  factory=None, parent=None, **uri_params):
         self.scope_fn = scope_fn
         self.path = raml.resource_full_path(path, parent)
-        self.name = raml.resource_name_from_path(self.path)
+        self.name = api.raml.resource_names.name(self.path)
         self.api = api
         self.app = api.app
         self.factory = factory
         self.raml_methods = self.api.raml.resources[self.path]
         self.uri_params = uri_params
+        node = next(iter(self.raml_methods.values()))
+        self.path_builder = node.path_builder.bind(api.path_prefix,
+                                                   **uri_params)
+        self.reset()
 
         RequestClass = self.api.RequestClass
         # if it looks like a webob request class, treat it like one
@@ -161,6 +229,25 @@ class ResourceScope(object):
                                 if getattr(RequestClass, 'blank', None)
                                 else RequestClass)
 
+    def reset(self):
+        "Forget the members registered by a previous call of the scope function."
+        self.members = collections.OrderedDict()
+
+    def register(self, obj, name=None):
+        """Register a test, fixture or nested scope function declared in this
+        scope under :name: (default: the object's ``__name__``).
+
+        The pytest plugin builds the module for the scope from its registered
+        members only. Tests, nested scopes and fixtures declared with
+        ``fixture`` register themselves; other module-level names, like
+        ``pytestmark``, can be registered with an explicit :name:.
+        """
+        self.members[name or obj.__name__] = obj
+
+    def collected(self):
+        "Return the names registered in the scope, as for a module."
+        return dict(self.members)
+
     @property
     def full_path(self):
         "Return the full path, including any prefix in the API's base_uri"
@@ -182,10 +269,12 @@ class ResourceScope(object):
         resource scope, which can be overridden by passing new values here.
         Unspecified URI param values try to find their value in the RAML
         example property.
+
+        Raises ``ra.raml.URIParameterError`` if a parameter has no value.
+        Tests are declared with the resolved path, so this is reported when
+        the tests are collected.
         """
-        args = self.uri_params.copy()
-        args.update(uri_params)
-        return self.full_path.format(**args)
+        return self.path_builder.build(uri_params)
 
     @property
     def resolved_path(self):
@@ -198,6 +287,20 @@ class ResourceScope(object):
         return self.api.resource(path, factory=factory, parent=self,
                                  **uri_params)
 
+    def fixture(self, fixture_fn=None, **fixture_params):
+        """Decorator for declaring a fixture local to this resource scope.
+
+        Works like ``pytest.fixture``; :fixture_params: are passed to it.
+        """
+        def decorator(fn):
+            fixture = pytest.fixture(**fixture_params)(fn)
+            self.register(fixture, fn.__name__)
+            return fixture
+
+        if six.callable(fixture_fn):
+            return decorator(fixture_fn)
+        return decorator
+
     def method(self, verb, test_fn=None, **req_params):
         """Generic method for defining a test, mostly used internally.
 
@@ -217,6 +320,18 @@ class ResourceScope(object):
                             use to create the body data for this test.  You
                             can also use ``query_params`` to pass
                             querystring parameters as a dict.
+
+                            ``max_latency_ms`` sets a latency budget for the
+                            request (or ``latency_budget``, for a
+                            ``ra.timing.LatencyBudget`` checking a
+                            percentile over repeated calls). By default the
+                            budget annotated in the RAML is used, if any.
+
+                            ``cases`` runs the test that many times in one
+                            test item, with a generated body and query
+                            string each time (``seed`` makes them
+                            reproducible); a failing case is shrunk to a
+                            minimal counterexample (see ``ra.cases``).
         """
         verb = verb.upper()
         content_type = req_params.pop('content_type', 'application/json')
@@ -224,57 +339,64 @@ class ResourceScope(object):
         try:
             method = self.raml_methods[verb]
         except KeyError:
+            method = None
             warnings.warn("Tried to add test for undeclared method "
                           "{} on {} (RAML={})".format(verb, self.path,
                                                       self.api.raml_path))
 
+        latency_budget = req_params.pop('latency_budget', None)
+        max_latency_ms = req_params.pop('max_latency_ms', None)
+        if latency_budget is None and max_latency_ms is not None:
+            latency_budget = timing.LatencyBudget(max_latency_ms)
+        if latency_budget is None:
+            latency_budget = getattr(method, 'latency_budget', None)
+
+        case_count = req_params.pop('cases', None)
+        seed = req_params.pop('seed', None)
+        schema_factory = None
+
         factory = req_params.pop('factory', None)
         data = req_params.pop('data', None)
         body = req_params.get('body', None)
-        query_params = req_params.get('query_params', {})
-
-        if body is None:
-            if data is None:
-                examples = self.api.examples
-                factory = (factory or
-                           self.factory or
-                           examples.get_factory(' '.join([verb, self.path])) or
-                           examples.get_factory(self.name) or
-                           None)
-
-                if factory is not None:
-                    data = factory()
+        query_params = req_params.pop('query_params', {})
+
+        if body is None and data is None:
+            examples = self.api.examples
+            if factory is None and self.factory is None and (
+                    case_count or self.api.generate_bodies):
+                schema_factory = self._schema_factory(verb)
+                if self.api.generate_bodies:
+                    factory = schema_factory
+            factory = (factory or
+                       self.factory or
+                       examples.get_factory(' '.join([verb, self.path])) or
+                       examples.get_factory(self.name) or
+                       None)
 
         url, query_string = merge_query_params(self.resolved_path,
                                                query_params or {})
 
         if not query_string:
-            query_string = req_params.pop(query_string, '')
+            query_string = req_params.pop('query_string', '')
 
         def decorator(fn):
-            req = self._request_factory(url,
-                                        method=verb,
-                                        query_string=query_string,
-                                        content_type='application/json',
-                                        **req_params)
-
-            req.factory = factory
-            req.data = data
-            req.body = body
-            req.JSONEncoder = self.api.JSONEncoder
-
-            if body is None:
-                req.encode_data()
-
-            req.raml = method
-            req.scope = self
+            builder = RequestBuilder(self, url, verb, method,
+                                     query_string=query_string,
+                                     factory=factory, data=data, body=body,
+                                     req_params=req_params,
+                                     latency_budget=latency_budget)
+            if case_count:
+                runner = cases.CaseRunner(builder, case_count, seed=seed,
+                                          schema_factory=schema_factory)
+                fn = cases.run_cases(fn, runner)
 
             # pytest collector will see this tag and recognize the function
-            # as a test function. The 'req' item will be returned by the
-            # 'req' fixture.
-            marks.mark(fn, type='test', req=req)
+            # as a test function. The request built by the builder will be
+            # returned by the 'req' fixture.
+            marks.mark(fn, type='test', req_builder=builder)
 
             self.api.test_suite.add_test(fn, method)
+            self.register(fn)
 
             return fn
 
@@ -282,6 +404,12 @@ class ResourceScope(object):
             return decorator(test_fn)
         return decorator
 
+    def _schema_factory(self, verb):
+        "Return the schema factory for the body of :verb: requests, if any."
+        schemas = self.api.schema_factories
+        return (schemas.get_factory(' '.join([verb, self.path])) or
+                schemas.get_factory(self.name))
+
     def get(self, test_fn=None, **req_params):
         """Decorator for defining GET method tests.
 
@@ -319,34 +447,138 @@ class ResourceScope(object):
         return self.method('options', test_fn=test_fn, **req_params)
 
 
+class RequestBuilder(object):
+    """Builds the request for a test when it's needed rather than when the
+    test is declared, so tests that aren't run never call their factory or
+    encode a body.
+
+    The request is built once by ``build`` and kept until ``release`` (the
+    pytest plugin releases it after the test has run).
+    """
+    def __init__(self, scope, url, verb, raml, query_string='',
+                 factory=None, data=None, body=None, req_params=None,
+                 latency_budget=None):
+        self.scope = scope
+        self.url = url
+        self.verb = verb
+        self.raml = raml
+        self.query_string = query_string
+        self.factory = factory
+        self.data = data
+        self.body = body
+        self.req_params = req_params or {}
+        self.latency_budget = latency_budget
+        self._req = None
+
+    def build(self):
+        "Return the request object, building it on first use."
+        if self._req is None:
+            self._req = self._build()
+        return self._req
+
+    def build_new(self):
+        "Build and return a new request, without keeping it."
+        return self._build()
+
+    def _build(self):
+        start = timing.clock()
+        scope = self.scope
+        data = self.data
+        if self.body is None and data is None and self.factory is not None:
+            data = self.factory()
+
+        req = scope._request_factory(self.url,
+                                     method=self.verb,
+                                     query_string=self.query_string,
+                                     content_type='application/json',
+                                     **self.req_params)
+
+        req.factory = self.factory
+        req.data = data
+        req.body = self.body
+        req.scope = scope
+        req.JSONEncoder = scope.api.JSONEncoder
+
+        if self.body is None:
+            req.encode_data()
+
+        req.raml = self.raml
+        req.latency_budget = self.latency_budget
+        req.build_time = timing.clock() - start
+        return req
+
+    @property
+    def built(self):
+        "The built request, or None if it hasn't been built (or released)."
+        return self._req
+
+    def release(self):
+        "Drop the built request (and its body), if any."
+        self._req = None
+
+
 class TestSuite(object):
     """Used internally to log when tests are added for a resource.
+
+    Tests are indexed by ``(METHOD, path)`` for constant-time lookups.
     """
     def __init__(self):
         self.tests = []
+        self.index = {}
 
     def add_test(self, test, resource_node):
+        """Log :test: for :resource_node:, which is None for methods the
+        RAML doesn't declare (those tests aren't indexed)."""
         self.tests.append((test, resource_node))
+        if resource_node is None:
+            return
+        key = (resource_node.method.upper(), resource_node.path)
+        self.index.setdefault(key, []).append(test)
 
     def test_exists(self, method, path):
-        for test, resource_node in self.tests:
-            if resource_node.method == method and resource_node.path == path:
-                return True
-        return False
+        return (method.upper(), path) in self.index
 
+    def uncovered(self, resources):
+        """Return ``(path, METHOD)`` pairs for the methods in :resources:
+        (mapped by path, then by method, like ``RootNode.resources``) that
+        have no test."""
+        return [(path, method)
+                for path, methods in six.iteritems(resources)
+                for method in methods
+                if (method.upper(), path) not in self.index]
 
-def _parse_raml(raml_path_or_string):
+
+def _parse_raml(raml_path_or_string, compact=False, shared=False):
     "Returns the RAML file path (or None if arg is a string) and parsed RAML."
     raml_path = '<str>'
     if not raml.is_raml(raml_path_or_string):
         raml_path = raml_path_or_string
 
-    parsed_raml = raml.parse(raml_path_or_string)
+    def parse(source):
+        return raml.parse(source, compact=compact)
+
+    if shared and raml_path != '<str>':
+        parsed_raml = registry.get_raml(raml_path, parse, compact=compact)
+    else:
+        parsed_raml = parse(raml_path_or_string)
 
     return raml_path, parsed_raml
 
 
 class Autotest(object):
+    """Generates a basic test for each method defined in the RAML.
+
+    Settings:
+
+    - ``ready``: readiness strategy called after each write method (see
+      ``ra.readiness``), default None (don't wait)
+    - ``postrequest_sleep``: if no ``ready`` strategy is set, seconds to
+      sleep after each write method
+    - ``workers``: if greater than 1, run independent resource subtrees
+      concurrently on this many threads (see ``ra.parallel``); meant for
+      remote targets. These tests aren't isolated by the suite's
+      ``isolation``
+    """
     def __init__(self, api, override=False, settings=None):
         if settings is None:
             settings = {}
@@ -356,6 +588,18 @@ class Autotest(object):
         self.test_suite = api.test_suite
         self.override = override
 
+        self.ready = settings.get('ready')
+        if self.ready is None and 'postrequest_sleep' in settings:
+            self.ready = readiness.sleep(settings['postrequest_sleep'])
+
+        self.runner = None
+        if settings.get('workers', 1) > 1:
+            self.runner = parallel.ConcurrentRunner(settings['workers'])
+            if api.isolation is not None:
+                warnings.warn("Concurrent autotests of {} aren't isolated: "
+                              "their requests run outside their tests"
+                              .format(api.raml_path))
+
     def generate(self):
         scopes = dict(self._genscope(path, methods, override=self.override)
                       for path, methods in six.iteritems(self.resources))
@@ -364,22 +608,52 @@ class Autotest(object):
         module.__dict__.update(scopes)
         return module
 
+    def wait(self, req, resp):
+        "Wait for the backend to be ready after a write method."
+        if self.ready is None or req.method.upper() not in \
+                readiness.WRITE_METHODS:
+            return
+        start = time.time()
+        try:
+            self.ready(req, resp)
+        finally:
+            readiness.stats.add(time.time() - start)
+
+    def run(self, req):
+        resp = req()
+        self.wait(req, resp)
+
     def _genscope(self, path, methods, override=False):
         @self.api.resource(path)
         def _autoresource(resource):
-            for method in methods:
-                if override and self.test_suite.test_exists(method, path):
-                    continue
-                method = method.lower()
-
-                @getattr(resource, method)
-                def test(req):
-                    req()
-                    from time import sleep
-                    sleep(self.settings.get('postrequest_sleep', 0.5))
-                test.__name__ = method
-                import inspect
-                inspect.currentframe().f_locals[method] = test
-                del test
+            try:
+                resource.resolved_path
+            except raml.URIParameterError as e:
+                # don't fail the collection of the other autotests
+                warnings.warn("Skipping autotests for {}: {}".format(path, e))
+                return
+            if override:
+                untested = self.test_suite.uncovered({path: methods})
+            else:
+                untested = [(path, method) for method in methods]
+            for _, method in untested:
+                self._gentest(resource, path, method)
 
         return (path_to_identifier(path), _autoresource)
+
+    def _gentest(self, resource, path, method):
+        runner = self.runner
+
+        if runner is None:
+            def test(req):
+                self.run(req)
+        else:
+            def test(req):
+                runner.result(marks.get(test, 'req_builder'))
+        test.__name__ = method.lower()
+        getattr(resource, method.lower())(test)
+
+        if runner is not None:
+            runner.add(path, method, marks.get(test, 'req_builder'),
+                       lambda builder: self.run(builder.build()))
+            marks.set(test, 'runner', runner)
@@ -1,3 +1,33 @@
+"""
+Factories for request body data.
+
+``Examples`` holds factories copying the example bodies declared in the RAML.
+``SchemaFactory`` compiles a JSON schema (or RAML named parameters, through
+``named_params_schema``) into a seeded generator of values valid against it,
+one at a time or in bulk with ``build_many``.
+"""
+import copy
+import datetime
+import math
+import random
+import string
+import uuid
+import warnings
+import six
+
+from .raml import named_params_to_json_schema
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+# seed of the suite's schema factories when none is given
+DEFAULT_SEED = 0
+
+
 class Examples(object):
     def __init__(self):
         self.factories = {}
@@ -22,56 +52,570 @@ class Examples(object):
         return self.factories[resource_name](**kwargs)
 
 
-# XXX: unused now, but should maybe use it as a helper for
-# defining custom factories
-class RandomValueGenerator(object):
-    def __init__(self, params):
-        self.params = dict(params)
-        super(RandomValueGenerator, self).__init__()
+class SchemaFactories(object):
+    """Schema factories keyed like ``Examples``.
+
+    Schemas are compiled into a ``SchemaFactory`` on first use, so schemas
+    that are never generated from don't cost anything (or fail) up front.
+    Schemas Ra can't generate values for (unsupported types, remote
+    ``$ref``, backreferences in patterns) have no factory: ``get_factory``
+    warns and returns None, and ``build`` raises the ValueError.
+
+    Each factory is seeded with :seed: (``DEFAULT_SEED`` if None) and its
+    name, so the same data is generated on every run.
+    """
+    def __init__(self, seed=None):
+        self.seed = DEFAULT_SEED if seed is None else seed
+        self.schemas = {}
+        self.factories = {}
+        self.errors = {}
+
+    def make_factory(self, name, schema):
+        self.schemas[name] = schema
+        self.factories.pop(name, None)
+        self.errors.pop(name, None)
+
+    def get_factory(self, name):
+        try:
+            return self.factories[name]
+        except KeyError:
+            pass
+        schema = self.schemas.get(name)
+        if schema is None:
+            return None
+        try:
+            factory = SchemaFactory(schema,
+                                    seed='{}:{}'.format(self.seed, name))
+        except ValueError as e:
+            warnings.warn("No schema factory for {}: {}".format(name, e))
+            self.errors[name] = e
+            factory = None
+        self.factories[name] = factory
+        return factory
+
+    def _require(self, name):
+        factory = self.get_factory(name)
+        if factory is None:
+            raise self.errors.get(name) or KeyError(name)
+        return factory
+
+    def build(self, name, **kwargs):
+        return self._require(name)(**kwargs)
+
+    def build_many(self, name, count):
+        return self._require(name).build_many(count)
+
+
+class SchemaFactory(object):
+    """Generates values valid against JSON schema :schema:.
+
+    Supports the ``type``, ``enum``, ``const``, ``minimum``/``maximum``
+    (and their exclusive forms), ``multipleOf``,
+    ``minLength``/``maxLength``, ``pattern``, ``format``, ``items``,
+    ``minItems``/``maxItems``, ``uniqueItems``, ``properties``,
+    ``required``, local ``$ref``, ``allOf``, ``anyOf`` and ``oneOf``
+    keywords. Required properties are always generated, optional ones half
+    of the time.
+
+    Calling the factory returns one value; keyword arguments override keys
+    of generated objects, like example factories. They raise ``TypeError``
+    unless the root schema is an object schema.
+    """
+    def __init__(self, schema, seed=None):
+        self.schema = schema
+        self.random = random.Random(seed)
+        self._generate = compile_generator(schema)
+        self._object = _is_object_schema(schema)
+
+    def reseed(self, seed):
+        self.random.seed(seed)
+
+    def __call__(self, **params):
+        if params and not self._object:
+            raise TypeError("Can't override keys {} of values generated from "
+                            "a non-object schema".format(
+                                ', '.join(sorted(params))))
+        value = self._generate(self.random)
+        if params:
+            value.update(params)
+        return value
+
+    def build_many(self, count):
+        "Return a list of :count: generated values."
+        generate = self._generate
+        rand = self.random
+        return [generate(rand) for _ in range(count)]
+
+
+def _is_object_schema(schema):
+    if not isinstance(schema, dict):
+        return False
+    types = schema.get('type')
+    if types is None:
+        return 'properties' in schema
+    return types in ('object', ['object'])
 
-    @classmethod
-    def generate_value(cls, params):
-        if 'example' in params:
-            return params['example']
+
+def named_params_schema(params):
+    """Return a JSON object schema for RAML named parameters :params: (query
+    or form parameters, mapped by name), translated with
+    ``ra.raml.named_params_to_json_schema``."""
+    properties = {}
+    required = []
+    for name, param in six.iteritems(params):
+        props = dict((param.raw or {}).get(name) or {})
+        props.setdefault('type', 'string')
+        if props['type'] == 'file':
+            continue
+        schema = named_params_to_json_schema(props)
+        if schema.pop('required', False):
+            required.append(name)
+        properties[name] = schema
+    schema = {'type': 'object', 'properties': properties}
+    if required:
+        schema['required'] = sorted(required)
+    return schema
+
+
+# ranges used for unconstrained values
+DEFAULT_LENGTH = (5, 20)
+DEFAULT_ITEMS = (1, 3)
+DEFAULT_RANGE = 1000
+MAX_REPEAT = 5
+MAX_RETRIES = 100
+
+ALPHABET = string.ascii_letters + string.digits
+PRINTABLE = [c for c in string.printable if c not in '\t\n\r\x0b\x0c']
+SCALAR_TYPES = six.string_types + six.integer_types + (float, bool,
+                                                       type(None))
+
+
+def compile_generator(schema, root=None, refs=None):
+    """Compile JSON schema :schema: into a function generating a valid value
+    from a ``random.Random`` instance.
+
+    Raises ValueError for schemas it can't generate values for.
+    """
+    if root is None:
+        root = schema
+    if refs is None:
+        refs = {}
+    if schema is True or schema == {}:
+        return _compile_string({})
+    if not isinstance(schema, dict):
+        raise ValueError("Not a JSON schema: {!r}".format(schema))
+
+    if '$ref' in schema:
+        return _compile_ref(schema['$ref'], root, refs)
+    if 'allOf' in schema:
+        return compile_generator(_merge_all_of(schema), root, refs)
+    for keyword in ('anyOf', 'oneOf'):
+        if keyword in schema:
+            base = dict((k, v) for k, v in six.iteritems(schema)
+                        if k != keyword)
+            return _choice_of([compile_generator(dict(base, **branch),
+                                                 root, refs)
+                               for branch in schema[keyword]])
+    if 'const' in schema:
+        return _constant(schema['const'])
+    if 'enum' in schema:
+        return _compile_enum(schema['enum'])
+
+    type_ = schema.get('type')
+    if isinstance(type_, list):
+        return _choice_of([compile_generator(dict(schema, type=t), root, refs)
+                           for t in type_])
+    if type_ is None:
+        if 'properties' in schema or 'required' in schema:
+            type_ = 'object'
+        elif 'items' in schema:
+            type_ = 'array'
+        elif 'minimum' in schema or 'maximum' in schema:
+            type_ = 'number'
         else:
-            generator = cls(params)
-            return generator()
-
-    def _random_string(self):
-        if 'enum' in self.params:
-            return random.choice(self.params['enum'])
-        min_length = self.params.get('minLength', 5)
-        max_length = self.params.get('maxLength', 20)
-        value_len = random.randint(min_length, max_length)
-        letters = [random.choice(ascii_letters)
-                   for i in range(value_len)]
-        return ''.join(letters)
-
-    def _random_number(self):
-        min_val = self.params.get('minimum', 1)
-        max_val = self.params.get('maximum', 100) - 1
-        val = random.randint(min_val, max_val)
-        return val + random.random()
-
-    def _random_integer(self):
-        min_val = self.params.get('minimum', 1)
-        max_val = self.params.get('maximum', 100)
-        return random.randint(min_val, max_val)
-
-    def _random_date(self):
-        from datetime import datetime
-        return datetime.now().isoformat()
-
-    def _random_boolean(self):
-        return random.choice([True, False])
-
-    def _random_array(self):
-        return [self._random_string()]
-
-    def _random_object(self):
-        return {self._random_string(): self._random_string()}
-
-    def __call__(self):
-        type_ = self.params.get('type', 'string')
-        func = getattr(self, '_random_{}'.format(type_))
-        return func()
+            type_ = 'string'
+    try:
+        compile_type = _TYPE_COMPILERS[type_]
+    except KeyError:
+        raise ValueError("Unsupported JSON schema type {!r}".format(type_))
+    return compile_type(schema, root, refs)
+
+
+def _constant(value):
+    if isinstance(value, SCALAR_TYPES):
+        return lambda rand: value
+    return lambda rand: copy.deepcopy(value)
+
+
+def _choice_of(generators):
+    if len(generators) == 1:
+        return generators[0]
+    return lambda rand: rand.choice(generators)(rand)
+
+
+def _compile_enum(values):
+    values = list(values)
+    if not values:
+        raise ValueError("Can't generate a value for an empty enum")
+    if all(isinstance(value, SCALAR_TYPES) for value in values):
+        return lambda rand: rand.choice(values)
+    return _choice_of([_constant(value) for value in values])
+
+
+def _compile_ref(ref, root, refs):
+    if not ref.startswith('#'):
+        raise ValueError("Only local $ref is supported, got {!r}".format(ref))
+    if ref not in refs:
+        # compiled lazily so recursive schemas terminate
+        refs[ref] = None
+        target = root
+        for part in ref.lstrip('#').split('/'):
+            if part:
+                part = part.replace('~1', '/').replace('~0', '~')
+                target = target[part]
+        refs[ref] = compile_generator(target, root, refs)
+
+    def generate(rand):
+        return refs[ref](rand)
+    return generate
+
+
+def _merge_all_of(schema):
+    merged = dict((k, v) for k, v in six.iteritems(schema) if k != 'allOf')
+    for sub in schema['allOf']:
+        for key, value in six.iteritems(sub):
+            if key == 'properties':
+                merged['properties'] = dict(merged.get('properties', {}),
+                                            **value)
+            elif key == 'required':
+                merged['required'] = sorted(set(merged.get('required', [])) |
+                                            set(value))
+            else:
+                merged.setdefault(key, value)
+    return merged
+
+
+def _compile_null(schema, root, refs):
+    return lambda rand: None
+
+
+def _compile_boolean(schema, root, refs):
+    return lambda rand: rand.random() < 0.5
+
+
+def _bounds(schema, default_low, default_high):
+    """Return the (low, high, exclusive_low, exclusive_high) bounds of a
+    numeric schema, for draft 4 (boolean exclusive flags) and later drafts
+    (numeric exclusive bounds)."""
+    low = schema.get('minimum')
+    high = schema.get('maximum')
+    excl_low = excl_high = False
+    for key, bound in (('exclusiveMinimum', 'low'),
+                       ('exclusiveMaximum', 'high')):
+        value = schema.get(key)
+        if isinstance(value, bool) or value is None:
+            if bound == 'low':
+                excl_low = bool(value)
+            else:
+                excl_high = bool(value)
+        elif bound == 'low':
+            if low is None or value >= low:
+                low, excl_low = value, True
+        elif high is None or value <= high:
+            high, excl_high = value, True
+    if low is None and high is None:
+        low, high = default_low, default_high
+    elif low is None:
+        low = high - DEFAULT_RANGE
+    elif high is None:
+        high = low + DEFAULT_RANGE
+    return low, high, excl_low, excl_high
+
+
+def _compile_integer(schema, root, refs):
+    low, high, excl_low, excl_high = _bounds(schema, 0, DEFAULT_RANGE)
+    low = int(math.floor(low)) + 1 if excl_low else int(math.ceil(low))
+    high = int(math.ceil(high)) - 1 if excl_high else int(math.floor(high))
+    step = schema.get('multipleOf')
+    if step:
+        first = int(math.ceil(float(low) / step))
+        last = int(math.floor(float(high) / step))
+        if first > last:
+            raise ValueError("No multiple of {} between {} and {}".format(
+                step, low, high))
+        step = int(step) if float(step).is_integer() else step
+        return lambda rand: rand.randint(first, last) * step
+    if low > high:
+        raise ValueError("Empty integer range {}..{}".format(low, high))
+    return lambda rand: rand.randint(low, high)
+
+
+def _compile_number(schema, root, refs):
+    if schema.get('multipleOf'):
+        return _compile_integer(schema, root, refs)
+    low, high, excl_low, excl_high = _bounds(schema, 0, DEFAULT_RANGE)
+    if low > high or (low == high and (excl_low or excl_high)):
+        raise ValueError("Empty number range {}..{}".format(low, high))
+
+    def generate(rand):
+        for _ in range(MAX_RETRIES):
+            value = rand.uniform(low, high)
+            if not ((excl_low and value <= low) or
+                    (excl_high and value >= high)):
+                return value
+        return (low + high) / 2.0
+    return generate
+
+
+def _random_date(rand):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(
+        days=rand.randint(0, 365 * 60))
+
+
+def _random_datetime(rand):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(
+        seconds=rand.randint(0, 60 * 60 * 24 * 365 * 60))
+
+
+def _random_word(rand, low=5, high=12):
+    return ''.join([rand.choice(ALPHABET)
+                    for _ in range(rand.randint(low, high))])
+
+
+FORMATS = {
+    'date-time': lambda rand: _random_datetime(rand).strftime(
+        '%Y-%m-%dT%H:%M:%SZ'),
+    'date': lambda rand: _random_date(rand).isoformat(),
+    'time': lambda rand: _random_datetime(rand).strftime('%H:%M:%SZ'),
+    'email': lambda rand: '{}@example.com'.format(_random_word(rand)
+                                                  .lower()),
+    'hostname': lambda rand: '{}.example.com'.format(_random_word(rand)
+                                                     .lower()),
+    'uri': lambda rand: 'http://example.com/{}'.format(_random_word(rand)),
+    'uuid': lambda rand: str(uuid.UUID(int=rand.getrandbits(128))),
+    'ipv4': lambda rand: '.'.join(str(rand.randint(0, 255))
+                                  for _ in range(4)),
+}
+
+
+def _compile_string(schema, root=None, refs=None):
+    min_length = schema.get('minLength')
+    max_length = schema.get('maxLength')
+    if 'pattern' in schema:
+        base = compile_pattern(schema['pattern'])
+    elif schema.get('format') in FORMATS:
+        base = FORMATS[schema['format']]
+    else:
+        low, high = DEFAULT_LENGTH
+        low = max(low, min_length or 0) if max_length is None else \
+            min(max(low, min_length or 0), max_length)
+        high = max(high, low) if max_length is None else \
+            min(max(high, low), max_length)
+        alphabet = ALPHABET
+
+        def letters(rand):
+            return ''.join([rand.choice(alphabet)
+                            for _ in range(rand.randint(low, high))])
+        return letters
+
+    if min_length is None and max_length is None:
+        return base
+
+    def generate(rand):
+        for _ in range(MAX_RETRIES):
+            value = base(rand)
+            if ((min_length is None or len(value) >= min_length) and
+                    (max_length is None or len(value) <= max_length)):
+                return value
+        raise ValueError("Couldn't generate a string within length bounds "
+                         "{}..{} for {!r}".format(min_length, max_length,
+                                                  schema))
+    return generate
+
+
+def _compile_array(schema, root, refs):
+    items = schema.get('items', {})
+    low = schema.get('minItems', DEFAULT_ITEMS[0])
+    high = schema.get('maxItems', max(DEFAULT_ITEMS[1], low))
+    low = min(low, high)
+    unique = schema.get('uniqueItems', False)
+
+    if isinstance(items, list):
+        tuple_items = [compile_generator(item, root, refs) for item in items]
+        extra = schema.get('additionalItems', {})
+        extra = (compile_generator(extra, root, refs)
+                 if extra is not False else None)
+        if extra is None:
+            high = min(high, len(tuple_items))
+
+        def generate(rand):
+            count = rand.randint(low, high)
+            values = [gen(rand) for gen in tuple_items[:count]]
+            values.extend(extra(rand)
+                          for _ in range(count - len(values)))
+            return values
+        return generate
+
+    item = compile_generator(items, root, refs)
+    if not unique:
+        return lambda rand: [item(rand) for _ in range(rand.randint(low,
+                                                                    high))]
+
+    def generate_unique(rand):
+        count = rand.randint(low, high)
+        values = []
+        for _ in range(count * MAX_RETRIES):
+            if len(values) == count:
+                break
+            value = item(rand)
+            if value not in values:
+                values.append(value)
+        if len(values) < low:
+            raise ValueError("Couldn't generate {} unique items for "
+                             "{!r}".format(low, schema))
+        return values
+    return generate_unique
+
+
+def _compile_object(schema, root, refs):
+    properties = schema.get('properties', {})
+    required = set(schema.get('required', []))
+    # RAML 0.8 schemas and draft 3 mark properties as required in place
+    required.update(name for name, prop in six.iteritems(properties)
+                    if isinstance(prop, dict) and prop.get('required') is True)
+    fields = []
+    for name in sorted(set(properties) | required):
+        prop = properties.get(name, {})
+        if isinstance(prop, dict) and prop.get('required') is True:
+            prop = dict((k, v) for k, v in six.iteritems(prop)
+                        if k != 'required')
+        fields.append((name, name in required,
+                       compile_generator(prop, root, refs)))
+
+    def generate(rand):
+        obj = {}
+        for name, is_required, gen in fields:
+            if is_required or rand.random() < 0.5:
+                obj[name] = gen(rand)
+        return obj
+    return generate
+
+
+_TYPE_COMPILERS = {
+    'null': _compile_null,
+    'boolean': _compile_boolean,
+    'integer': _compile_integer,
+    'number': _compile_number,
+    'string': _compile_string,
+    'array': _compile_array,
+    'object': _compile_object,
+}
+
+
+def compile_pattern(pattern):
+    """Compile regular expression :pattern: into a function generating
+    strings it matches from a ``random.Random`` instance.
+
+    Handles literals, character classes and categories, alternation,
+    groups and repetition (unbounded repeats are capped); anchors and
+    lookarounds generate nothing. Raises ValueError for backreferences.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as ex:
+        raise ValueError("Invalid pattern {!r}: {}".format(pattern, ex))
+    return _compile_subpattern(parsed, pattern)
+
+
+def _compile_subpattern(items, pattern):
+    parts = [_compile_token(op, av, pattern) for op, av in items]
+    parts = [part for part in parts if part is not None]
+    if len(parts) == 1:
+        return parts[0]
+    return lambda rand: ''.join([part(rand) for part in parts])
+
+
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: string.digits,
+    sre_constants.CATEGORY_WORD: string.ascii_letters + string.digits + '_',
+    sre_constants.CATEGORY_SPACE: ' ',
+}
+_NOT_CATEGORIES = {
+    sre_constants.CATEGORY_NOT_DIGIT: sre_constants.CATEGORY_DIGIT,
+    sre_constants.CATEGORY_NOT_WORD: sre_constants.CATEGORY_WORD,
+    sre_constants.CATEGORY_NOT_SPACE: sre_constants.CATEGORY_SPACE,
+}
+
+
+def _category_chars(category):
+    if category in _CATEGORIES:
+        return set(_CATEGORIES[category])
+    if category in _NOT_CATEGORIES:
+        return set(PRINTABLE) - set(_CATEGORIES[_NOT_CATEGORIES[category]]) \
+            - set(string.whitespace)
+    raise ValueError("Unsupported category {}".format(category))
+
+
+def _class_chars(items, pattern):
+    chars = set()
+    negate = False
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            negate = True
+        elif op == sre_constants.LITERAL:
+            chars.add(six.unichr(av))
+        elif op == sre_constants.RANGE:
+            low, high = av
+            if high - low > len(PRINTABLE):
+                in_range = [c for c in PRINTABLE if low <= ord(c) <= high]
+                chars.update(in_range or [six.unichr(low)])
+            else:
+                chars.update(six.unichr(c) for c in range(low, high + 1))
+        elif op == sre_constants.CATEGORY:
+            chars.update(_category_chars(av))
+        else:
+            raise ValueError("Can't generate strings for pattern {!r} "
+                             "(unsupported {})".format(pattern, op))
+    if negate:
+        chars = set(PRINTABLE) - chars
+    if not chars:
+        raise ValueError("Empty character class in pattern {!r}".format(
+            pattern))
+    return sorted(chars)
+
+
+def _compile_token(op, av, pattern):
+    c = sre_constants
+    if op == c.LITERAL:
+        char = six.unichr(av)
+        return lambda rand: char
+    if op == c.NOT_LITERAL:
+        chars = [ch for ch in PRINTABLE if ord(ch) != av]
+        return lambda rand: rand.choice(chars)
+    if op == c.ANY:
+        return lambda rand: rand.choice(PRINTABLE)
+    if op == c.IN:
+        chars = _class_chars(av, pattern)
+        if len(chars) == 1:
+            char = chars[0]
+            return lambda rand: char
+        return lambda rand: rand.choice(chars)
+    if op == c.BRANCH:
+        return _choice_of([_compile_subpattern(branch, pattern)
+                           for branch in av[1]])
+    if op == c.SUBPATTERN:
+        return _compile_subpattern(av[-1], pattern)
+    if op in (c.MAX_REPEAT, c.MIN_REPEAT,
+              getattr(c, 'POSSESSIVE_REPEAT', c.MAX_REPEAT)):
+        low, high, sub = av
+        if high == c.MAXREPEAT:
+            high = low + MAX_REPEAT
+        item = _compile_subpattern(sub, pattern)
+        return lambda rand: ''.join([item(rand) for _ in
+                                     range(rand.randint(low, high))])
+    if op == getattr(c, 'ATOMIC_GROUP', None):
+        return _compile_subpattern(av, pattern)
+    if op in (c.AT, c.ASSERT, c.ASSERT_NOT):
+        return None
+    raise ValueError("Can't generate strings for pattern {!r} (unsupported "
+                     "{})".format(pattern, op))
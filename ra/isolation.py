@@ -0,0 +1,94 @@
+"""
+Per-test isolation hooks.
+
+An ``Isolation`` given to ``ra.api()`` (or set as ``api.isolation``) is
+begun before each resource scope test of the suite and its function-scoped
+fixtures are set up, and rolled back after they have been torn down, so a
+test can leave data behind without affecting the tests that follow it, and
+without cleaning up through the API. Fixtures of wider scopes (module,
+session) are set up before the isolation is begun, so what they create is
+kept for the tests that follow.
+
+``SQLAlchemyIsolation`` is the reference implementation, for in-process
+WSGI apps storing their data with SQLAlchemy: each test runs in a savepoint
+that is rolled back afterwards.
+"""
+import weakref
+
+
+# isolations with resources to release when the test session ends
+_open = weakref.WeakSet()
+
+
+class Isolation(object):
+    """Base class for isolation hooks.
+
+    ``begin`` and ``rollback`` are passed the ``ra.dsl.RequestBuilder`` of
+    the test. ``close`` is called once when the test session ends.
+    """
+    def begin(self, builder=None):
+        pass
+
+    def rollback(self, builder=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLAlchemyIsolation(Isolation):
+    """Runs each test in a savepoint on a single connection of SQLAlchemy
+    :engine:, rolled back after the test.
+
+    The connection and an outer transaction are opened when the first test
+    begins, and rolled back by ``close``, so nothing the tests write is ever
+    committed. The app must use the same connection: :bind: is called with
+    it when it is opened, to point the app's sessions at it::
+
+        def bind(connection):
+            DBSession.configure(bind=connection,
+                                join_transaction_mode='create_savepoint')
+
+    With ``join_transaction_mode='create_savepoint'`` (SQLAlchemy 2.0), the
+    app's commits release savepoints of their own instead of committing.
+    The app should close its sessions at the end of each request (as
+    ``scoped_session.remove()`` does), so no objects are cached across
+    tests.
+    """
+    def __init__(self, engine, bind=None):
+        self.engine = engine
+        self.bind = bind
+        self.connection = None
+        self.transaction = None
+        self.savepoint = None
+
+    def begin(self, builder=None):
+        if self.connection is None:
+            self.connection = self.engine.connect()
+            self.transaction = self.connection.begin()
+            _open.add(self)
+            if self.bind is not None:
+                self.bind(self.connection)
+        self.savepoint = self.connection.begin_nested()
+
+    def rollback(self, builder=None):
+        savepoint, self.savepoint = self.savepoint, None
+        if savepoint is not None and savepoint.is_active:
+            savepoint.rollback()
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            if self.transaction.is_active:
+                self.transaction.rollback()
+        finally:
+            self.connection.close()
+            self.connection = self.transaction = self.savepoint = None
+            _open.discard(self)
+
+
+def close_all():
+    "Close the isolations that have been begun (called by the plugin)."
+    for isolation in list(_open):
+        isolation.close()
@@ -0,0 +1,181 @@
+"""
+Load generation from Ra test definitions.
+
+The requests declared by resource scope tests and autotests (their
+``ra.dsl.RequestBuilder``) are replayed from concurrent worker threads for a
+fixed duration or number of requests, picking an endpoint at random for
+each request according to its weight. Each request is built afresh, so
+factories generate new body data every time.
+
+Run it through the pytest plugin with ``--ra-load`` (see
+``docs/source/load_testing.rst``).
+"""
+import bisect
+import random
+import threading
+from . import timing
+from .request import _condition_match
+
+
+class EndpointStats(object):
+    "Latencies and error count of the requests sent to one endpoint."
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.latencies = []
+        self.errors = 0
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            'endpoint': self.endpoint,
+            'count': count,
+            'errors': self.errors,
+            'error_rate': float(self.errors) / count if count else 0.0,
+            'throughput': count / elapsed if elapsed else 0.0,
+            'mean': sum(latencies) / count if count else None,
+            'p50': timing.percentile(latencies, 50),
+            'p95': timing.percentile(latencies, 95),
+            'p99': timing.percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        }
+
+
+def parse_weights(specs):
+    """Parse ``"PATTERN=WEIGHT"`` strings into ``(pattern, weight)`` pairs.
+
+    Patterns are matched like ``req.match`` conditions ("GET /users",
+    "/users/*", "DELETE").
+    """
+    weights = []
+    for spec in specs or []:
+        pattern, sep, weight = spec.rpartition('=')
+        if not sep or not pattern.strip():
+            raise ValueError("Invalid endpoint weight {!r}, expected "
+                             "'PATTERN=WEIGHT'".format(spec))
+        weights.append((pattern.strip(), float(weight)))
+    return weights
+
+
+class LoadRunner(object):
+    """Replays requests from :workers: threads until :duration: seconds have
+    passed or :requests: requests have been sent, whichever comes first.
+
+    :param builders:    ``ra.dsl.RequestBuilder`` objects of the requests to
+                        replay
+    :param weights:     ``(pattern, weight)`` pairs; an endpoint gets the
+                        weight of the first pattern it matches (default 1).
+                        Endpoints with a weight of 0 aren't requested.
+    :param validate:    passed to each request call (default False, so only
+                        errors raised by the app count as errors)
+    :param seed:        seed for endpoint selection
+    """
+    def __init__(self, builders, workers=4, duration=None, requests=None,
+                 weights=None, validate=False, seed=None):
+        if duration is None and requests is None:
+            raise ValueError("A load run needs a duration or a number of "
+                             "requests")
+        self.workers = workers
+        self.duration = duration
+        self.requests = requests
+        self.validate = validate
+        self.random = random.Random(seed)
+
+        by_endpoint = {}
+        for builder in builders:
+            name = '{} {}'.format(builder.verb.upper(), builder.scope.path)
+            by_endpoint.setdefault(name, []).append(builder)
+
+        self.endpoints = []
+        self.cumulative = []
+        total = 0.0
+        for name in sorted(by_endpoint):
+            weight = _weight_for(name, weights or [])
+            if weight <= 0:
+                continue
+            total += weight
+            self.endpoints.append((name, by_endpoint[name]))
+            self.cumulative.append(total)
+        if not self.endpoints:
+            raise ValueError("No endpoints to send requests to")
+
+        self.stats = dict((name, EndpointStats(name))
+                          for name, _ in self.endpoints)
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._sent = 0
+        self._deadline = None
+
+    def choose(self):
+        "Pick the builder of the next request, by endpoint weight."
+        with self._lock:
+            point = self.random.random() * self.cumulative[-1]
+            name, builders = self.endpoints[
+                bisect.bisect_right(self.cumulative, point)]
+            return name, self.random.choice(builders)
+
+    def _claim(self):
+        "Return True if another request may be sent."
+        if self._deadline is not None and timing.clock() >= self._deadline:
+            return False
+        with self._lock:
+            if self.requests is not None and self._sent >= self.requests:
+                return False
+            self._sent += 1
+            return True
+
+    def _worker(self):
+        while self._claim():
+            name, builder = self.choose()
+            stats = self.stats[name]
+            failed = False
+            start = timing.clock()
+            try:
+                req = builder.build_new()
+                # latency budgets repeat requests; load runs measure them
+                req.latency_budget = None
+                req(validate=self.validate)
+            except Exception:
+                failed = True
+            latency = timing.clock() - start
+            with self._lock:
+                stats.latencies.append(latency)
+                if failed:
+                    stats.errors += 1
+
+    def run(self):
+        "Send the requests and return the per-endpoint summary."
+        start = timing.clock()
+        if self.duration is not None:
+            self._deadline = start + self.duration
+        threads = [threading.Thread(target=self._worker,
+                                    name='ra-load-{}'.format(i))
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = timing.clock() - start
+        return self.summary()
+
+    def summary(self):
+        """Return a list of per-endpoint summaries (count, errors,
+        error_rate, throughput in requests per second, and mean, p50, p95,
+        p99 and max latency in seconds), busiest first."""
+        rows = [stats.summary(self.elapsed)
+                for stats in self.stats.values() if stats.count]
+        rows.sort(key=lambda row: (-row['count'], row['endpoint']))
+        return rows
+
+
+def _weight_for(endpoint, weights):
+    method, path = endpoint.split(' ', 1)
+    for pattern, weight in weights:
+        if _condition_match(pattern, method, path):
+            return weight
+    return 1.0
@@ -0,0 +1,190 @@
+"""
+Concurrent execution of autotests over independent resource subtrees.
+
+Resources sharing a top-level path segment ("/users", "/users/{username}",
+"/users/{username}/profile") form a subtree whose requests depend on each
+other, so they run serially in dependency order: every non-DELETE method
+parents first (POST before the other methods on each resource), then the
+DELETEs children first. Separate subtrees don't depend on each other and
+run on a thread pool.
+
+Requests are run ahead of the pytest items; each item waits for the result
+of its own request and re-raises its failure, so failures are still
+reported as normal pytest items. Since the requests don't run within their
+tests, they aren't covered by the suite's isolation hooks (see
+``ra.isolation``).
+"""
+import collections
+import sys
+import threading
+import weakref
+from multiprocessing.pool import ThreadPool
+import six
+
+
+# runners with thread pools to close when the test session ends
+_open = weakref.WeakSet()
+
+
+METHOD_PRIORITY = {
+    'POST':     1,
+    'GET':      2,
+    'PUT':      2,
+    'PATCH':    2,
+    'HEAD':     2,
+    'OPTIONS':  2,
+}
+
+
+def subtree_key(path):
+    "Return the top-level path segment of the subtree :path: belongs to."
+    return path.strip('/').split('/', 1)[0]
+
+
+def path_depth(path):
+    return len(path.strip('/').split('/'))
+
+
+def dependency_order(tasks):
+    """Order the ``(path, method, ...)`` tuples of one subtree so parents
+    are created before their children and deleted after them."""
+    deletes = [task for task in tasks if task[1].upper() == 'DELETE']
+    others = [task for task in tasks if task[1].upper() != 'DELETE']
+    others.sort(key=lambda task: (path_depth(task[0]),
+                                  METHOD_PRIORITY.get(task[1].upper(), 3)))
+    deletes.sort(key=lambda task: -path_depth(task[0]))
+    return others + deletes
+
+
+class _Task(object):
+    def __init__(self, path, method, req, run):
+        self.path = path
+        self.method = method
+        self.req = req
+        self.run = run
+        self.exc_info = None
+        self.scheduled = False
+        self.done = threading.Event()
+
+    def __call__(self):
+        try:
+            self.run(self.req)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+
+class ConcurrentRunner(object):
+    """Runs registered requests concurrently over independent resource
+    subtrees, using :workers: threads.
+
+    Requests are registered with ``add`` when tests are generated. The pytest
+    plugin then calls ``select`` for every request whose test was selected
+    for the session (if none are, all registered requests run). The first
+    call to ``result`` starts the run.
+
+    On pytest-xdist workers, which collect every test but only run some of
+    them, the plugin calls ``distribute``: subtrees are then started one at
+    a time, when one of their requests is first waited for, or each request
+    runs on its own if a subtree's tests may be spread across workers.
+
+    ``close`` waits for the started subtrees and stops the threads; the
+    plugin calls it when the test session ends.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.tasks = collections.OrderedDict()
+        self.selected = set()
+        self.lazy = False
+        self.inline = False
+        self._groups = None
+        self._started = set()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def add(self, path, method, req, run):
+        """Register :req: for resource :path: and :method:, run with run(req).
+
+        :req: is any object identifying the request, e.g. the test's
+        ``ra.dsl.RequestBuilder``.
+        """
+        self.tasks[id(req)] = _Task(path, method, req, run)
+
+    def select(self, req):
+        self.selected.add(id(req))
+
+    def distribute(self, grouped):
+        """Run on a distributed test worker. If :grouped:, all the tests of a
+        subtree run on the same worker, so a subtree is started when one of
+        its requests is first waited for; otherwise each request is run
+        when it is waited for, in the waiting thread."""
+        self.lazy = grouped
+        self.inline = not grouped
+
+    def _subtrees(self):
+        groups = collections.OrderedDict()
+        for key, task in six.iteritems(self.tasks):
+            if self.selected and key not in self.selected:
+                continue
+            groups.setdefault(subtree_key(task.path), []).append(
+                (task.path, task.method, task))
+        return collections.OrderedDict(
+            (key, [task for _, _, task in dependency_order(group)])
+            for key, group in six.iteritems(groups))
+
+    def subtrees(self):
+        "Return the selected tasks, grouped by subtree in dependency order."
+        return list(self._subtrees().values())
+
+    def start(self, path=None):
+        """Start running the selected subtrees, or only the subtree of
+        :path: if the runner is lazy."""
+        with self._lock:
+            if self._groups is None:
+                self._groups = self._subtrees()
+            for key, subtree in six.iteritems(self._groups):
+                if key in self._started or (
+                        self.lazy and key != subtree_key(path)):
+                    continue
+                self._started.add(key)
+                if self._pool is None:
+                    self._pool = ThreadPool(self.workers)
+                    _open.add(self)
+                for task in subtree:
+                    task.scheduled = True
+                self._pool.apply_async(_run_serially, (subtree,))
+
+    def result(self, req):
+        """Wait for the request to be run, re-raising its failure (if any)
+        in the calling thread."""
+        task = self.tasks[id(req)]
+        if not self.inline:
+            self.start(task.path)
+        if not task.scheduled:
+            task.scheduled = True
+            task()
+        task.done.wait()
+        if task.exc_info is not None:
+            six.reraise(*task.exc_info)
+
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        pool.close()
+        pool.join()
+        _open.discard(self)
+
+
+def close_all():
+    "Close the runners that have been started (called by the plugin)."
+    for runner in list(_open):
+        runner.close()
+
+
+def _run_serially(tasks):
+    for task in tasks:
+        task()
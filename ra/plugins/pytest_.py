@@ -1,11 +1,13 @@
 import imp
 import sys
 import types
+import warnings
 import pytest
+import simplejson as json
 from _pytest.python import PyCollector, Module
 
 from ..dsl import APISuite
-from .. import marks
+from .. import cache, isolation, marks, parallel, readiness, registry, timing
 
 
 """pytest plugin for Ra.
@@ -15,22 +17,29 @@ Large amounts of code stolen from `pytest-describe
 """
 
 
-def trace_function(funcobj, *args, **kwargs):
-    """Call a function, and return its locals"""
-    funclocals = {}
-
-    def _tracefunc(frame, event, arg):
-        # Activate local trace for first call only
-        if frame.f_back.f_locals.get('_tracefunc') == _tracefunc:
-            if event == 'return':
-                funclocals.update(frame.f_locals.copy())
-
-    sys.setprofile(_tracefunc)
-    try:
-        funcobj(*args, **kwargs)
-    finally:
-        sys.setprofile(None)
-
+def scope_locals(funcobj, scope):
+    """Call a resource scope function, and return the names registered in it.
+
+    Tests, nested scopes and fixtures register themselves on the
+    ``ResourceScope`` as they're declared. Functions the scope function
+    defines without registering them (like plain ``pytest.fixture``
+    functions) aren't collected; a warning lists them.
+    """
+    scope.reset()
+    funcobj(scope)
+    funclocals = scope.collected()
+
+    code = funcobj.__code__
+    names = code.co_varnames + code.co_cellvars
+    missing = [const.co_name for const in code.co_consts
+               if isinstance(const, types.CodeType) and
+               const.co_name in names and const.co_name not in funclocals]
+    if missing:
+        warnings.warn(
+            "Resource scope {} defines functions Ra doesn't collect: {}. "
+            "Declare fixtures with the scope's fixture decorator, or "
+            "register other names with its register method.".format(
+                scope.path, ', '.join(missing)))
     return funclocals
 
 
@@ -38,7 +47,7 @@ def make_module_from_function(funcobj):
     """Evaluates the local scope of a function, as if it was a module"""
     module = imp.new_module(funcobj.__name__)
     scope = marks.get(funcobj, 'scope')
-    funclocals = trace_function(funcobj, scope)
+    funclocals = scope_locals(funcobj, scope)
     module.__dict__.update(funclocals)
     return module
 
@@ -175,6 +184,269 @@ class AutotestCollector(PyCollector):
                                 repr(self._module.__name__))
 
 
+DURATIONS_KEY = 'ra/scope_durations'
+
+
+def scope_unit(nodeid):
+    """Return the work unit a test belongs to when distributing tests.
+
+    Tests in resource scopes are grouped by module and the top-level segment
+    of the outermost resource scope, so a scope, its nested scopes and
+    sibling scopes for the same resource ("/users" and "/users/{username}")
+    stay together. Other tests are grouped by module or class.
+    """
+    parts = nodeid.split('::')
+    for i, part in enumerate(parts[1:], 1):
+        if part.startswith('/'):
+            return '::'.join(parts[:i] + ['/' + parallel.subtree_key(part)])
+    return nodeid.rsplit('::', 1)[0]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('ra')
+    group.addoption('--ra-no-raml-cache', action='store_true', default=False,
+                    help="don't cache parsed RAML in pytest's cache dir")
+    group.addoption('--ra-dist', action='store_true', default=False,
+                    help="with pytest-xdist, distribute resource scopes to "
+                         "workers as whole units, longest first")
+    group.addoption('--ra-slowest', type=int, default=10, metavar='N',
+                    help="show the N slowest endpoints by mean request time "
+                         "(default: 10, 0 to disable)")
+    group.addoption('--ra-timings-json', metavar='PATH', default=None,
+                    help="write the timings of each request to PATH as "
+                         "JSON lines")
+    group.addoption('--ra-load', action='store_true', default=False,
+                    help="instead of running the selected tests, replay "
+                         "their requests as a load test")
+    group.addoption('--ra-load-workers', type=int, default=4, metavar='N',
+                    help="concurrent workers sending requests (default: 4)")
+    group.addoption('--ra-load-duration', type=float, default=None,
+                    metavar='SECONDS',
+                    help="length of the load test (default: 10 seconds, "
+                         "unless --ra-load-requests is given)")
+    group.addoption('--ra-load-requests', type=int, default=None,
+                    metavar='N', help="stop after sending N requests")
+    group.addoption('--ra-load-weight', action='append', default=[],
+                    metavar='PATTERN=WEIGHT',
+                    help="relative weight of the endpoints matching PATTERN "
+                         "(e.g. 'GET /users=5'; default weight 1, 0 to "
+                         "skip); can be repeated")
+    group.addoption('--ra-load-validate', action='store_true', default=False,
+                    help="validate load test responses against the RAML")
+
+
+def scope_scheduling(config):
+    "Return whether tests are distributed by ``ResourceScopeScheduling``."
+    return (bool(config.getoption('ra_dist')) and
+            config.getoption('dist', 'no') != 'no')
+
+
+class ScopeDurations(object):
+    """Records test durations per work unit (see ``scope_unit``) in pytest's
+    cache, to balance ``ResourceScopeScheduling`` on the next run."""
+    def __init__(self, config):
+        self.config = config
+        self.durations = {}
+
+    def pytest_runtest_logreport(self, report):
+        unit = scope_unit(report.nodeid)
+        self.durations[unit] = self.durations.get(unit, 0.0) + report.duration
+
+    def pytest_sessionfinish(self, session):
+        if self.durations:
+            recorded = self.config.cache.get(DURATIONS_KEY, {})
+            recorded.update(self.durations)
+            self.config.cache.set(DURATIONS_KEY, recorded)
+
+
+class RequestTimings(object):
+    """Collects the request timings added to test reports, to summarize the
+    slowest endpoints and optionally write them out as JSON lines."""
+    def __init__(self, config):
+        self.config = config
+        self.records = []
+
+    def pytest_runtest_logreport(self, report):
+        for name, value in report.user_properties:
+            if name == 'ra_timings':
+                self.records.extend((report.nodeid, timings)
+                                    for timings in value)
+
+    def pytest_sessionfinish(self, session):
+        path = self.config.getoption('ra_timings_json')
+        if path and self.records:
+            with open(path, 'w') as f:
+                for nodeid, timings in self.records:
+                    line = dict(timings, nodeid=nodeid,
+                                total=timing.total(timings))
+                    f.write(json.dumps(line, sort_keys=True) + '\n')
+
+    def pytest_terminal_summary(self, terminalreporter):
+        slowest = self.config.getoption('ra_slowest')
+        if not slowest or not self.records:
+            return
+        rows = timing.summarize((timings['endpoint'], timings)
+                                for _, timings in self.records)
+        terminalreporter.write_sep('-', 'ra slowest {} endpoints'.format(
+            min(slowest, len(rows))))
+        width = max(len(row['endpoint']) for row in rows[:slowest])
+        terminalreporter.write_line('{:<{}}  {:>5}  {:>9}  {:>9}  {:>9}  {:>9}'
+                                    .format('endpoint', width, 'count', 'mean',
+                                            'p50', 'p95', 'max'))
+        for row in rows[:slowest]:
+            terminalreporter.write_line(
+                '{:<{}}  {:>5}  {:>7.1f}ms  {:>7.1f}ms  {:>7.1f}ms  {:>7.1f}ms'
+                .format(row['endpoint'], width, row['count'],
+                        row['mean'] * 1000, row['p50'] * 1000,
+                        row['p95'] * 1000, row['max'] * 1000))
+
+
+def pytest_configure(config):
+    if not hasattr(config, 'workerinput'):
+        config.pluginmanager.register(RequestTimings(config),
+                                      'ra_request_timings')
+    config_cache = getattr(config, 'cache', None)
+    if config_cache is None:
+        return
+    if not hasattr(config, 'workerinput') and scope_scheduling(config):
+        # only the xdist controller records, for the next run's scheduling
+        config.pluginmanager.register(ScopeDurations(config),
+                                      'ra_scope_durations')
+    if not config.getoption('ra_no_raml_cache'):
+        makedir = (getattr(config_cache, 'mkdir', None) or
+                   config_cache.makedir)
+        cache.set_default_dir(str(makedir('ra')))
+
+
+def pytest_unconfigure(config):
+    parallel.close_all()
+    isolation.close_all()
+    # the asyncio engine (Python 3 only) is imported by the suites using it
+    aio = sys.modules.get('ra.aio')
+    if aio is not None:
+        aio.close_all()
+    registry.clear()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if config.getoption('ra_dist'):
+        from .xdist_ import ResourceScopeScheduling
+        return ResourceScopeScheduling(config, log)
+
+
+def pytest_collection_finish(session):
+    # let concurrent autotest runners know which requests to run; xdist
+    # workers collect every test, so they only run the subtrees they're given
+    config = session.config
+    worker = hasattr(config, 'workerinput')
+    runners = set()
+    for item in session.items:
+        fn = getattr(item, 'obj', None)
+        runner = marks.get(fn, 'runner') if fn is not None else None
+        if runner is not None:
+            runner.select(marks.get(fn, 'req_builder'))
+            runners.add(runner)
+    if worker:
+        for runner in runners:
+            runner.distribute(grouped=config.getoption('ra_dist'))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    if call.when != 'call':
+        return
+    fn = getattr(item, 'obj', None)
+    builder = marks.get(fn, 'req_builder') if fn is not None else None
+    req = builder and builder.built
+    report = outcome.get_result()
+    timings = getattr(req, 'timings', None)
+    if timings:
+        endpoint = timing.endpoint(req)
+        report.user_properties.append(
+            ('ra_timings', [dict(t, endpoint=endpoint) for t in timings]))
+    sampling = getattr(req, 'sampling', None)
+    if sampling:
+        # report how many array items a sampling validation policy checked
+        validated = sum(v for v, _ in sampling)
+        total = sum(t for _, t in sampling)
+        report.user_properties.append(
+            ('ra_sampled_items', '{}/{}'.format(validated, total)))
+        report.sections.append(
+            ('ra validation', 'validated {} of {} array items ({:.1%})'
+                              .format(validated, total,
+                                      float(validated) / (total or 1))))
+
+
+def pytest_terminal_summary(terminalreporter):
+    runner = getattr(terminalreporter.config, '_ra_load', None)
+    if runner is not None:
+        write_load_summary(terminalreporter, runner)
+    if readiness.stats.count:
+        terminalreporter.write_sep('-', 'ra autotest readiness')
+        terminalreporter.write_line(
+            'waited {:.2f}s in total after {} write requests'.format(
+                readiness.stats.total, readiness.stats.count))
+
+
+def write_load_summary(terminalreporter, runner):
+    rows = runner.summary()
+    count = sum(row['count'] for row in rows)
+    errors = sum(row['errors'] for row in rows)
+    terminalreporter.write_sep('-', 'ra load test')
+    terminalreporter.write_line(
+        '{} requests in {:.1f}s from {} workers: {:.1f} req/s, {:.2%} errors'
+        .format(count, runner.elapsed, runner.workers,
+                count / runner.elapsed if runner.elapsed else 0.0,
+                float(errors) / count if count else 0.0))
+    if not rows:
+        return
+    width = max(len(row['endpoint']) for row in rows)
+    terminalreporter.write_line(
+        '{:<{}}  {:>6}  {:>8}  {:>7}  {:>9}  {:>9}  {:>9}  {:>9}'.format(
+            'endpoint', width, 'count', 'req/s', 'errors', 'p50', 'p95',
+            'p99', 'max'))
+    for row in rows:
+        terminalreporter.write_line(
+            '{:<{}}  {:>6}  {:>8.1f}  {:>7.2%}  {:>7.1f}ms  {:>7.1f}ms  '
+            '{:>7.1f}ms  {:>7.1f}ms'.format(
+                row['endpoint'], width, row['count'], row['throughput'],
+                row['error_rate'], row['p50'] * 1000, row['p95'] * 1000,
+                row['p99'] * 1000, row['max'] * 1000))
+
+
+def pytest_runtestloop(session):
+    if not session.config.getoption('ra_load'):
+        return None
+    from .. import load
+    config = session.config
+    builders = []
+    for item in session.items:
+        fn = getattr(item, 'obj', None)
+        builder = marks.get(fn, 'req_builder') if fn is not None else None
+        if builder is not None:
+            builders.append(builder)
+
+    duration = config.getoption('ra_load_duration')
+    requests = config.getoption('ra_load_requests')
+    if duration is None and requests is None:
+        duration = 10.0
+    try:
+        runner = load.LoadRunner(
+            builders,
+            workers=config.getoption('ra_load_workers'),
+            duration=duration,
+            requests=requests,
+            weights=load.parse_weights(config.getoption('ra_load_weight')),
+            validate=config.getoption('ra_load_validate'))
+    except ValueError as e:
+        raise pytest.UsageError('--ra-load: {}'.format(e))
+    config._ra_load = runner
+    runner.run()
+    return True
+
+
 def pytest_pycollect_makeitem(collector, name, obj):
     if isinstance(obj, types.FunctionType):
         if marks.get(obj, 'type')  == 'resource':
@@ -185,9 +457,36 @@ def pytest_pycollect_makeitem(collector, name, obj):
             return AutotestCollector(autotest, collector)
 
 
+def isolated_builder(fn):
+    """Return the ``RequestBuilder`` of test function :fn: if its suite
+    isolates its tests, else None. Requests of concurrent autotest runners
+    don't run within their tests, so they aren't isolated."""
+    builder = marks.get(fn, 'req_builder') if fn is not None else None
+    if (builder is None or builder.scope.api.isolation is None or
+            marks.get(fn, 'runner') is not None):
+        return None
+    return builder
+
+
+@pytest.fixture(autouse=True)
+def _ra_isolation(request):
+    # autouse function fixtures are set up after the fixtures of wider
+    # scopes, which thus aren't created in (and rolled back with) the
+    # isolation of the first test using them
+    builder = isolated_builder(getattr(request.node, 'obj', None))
+    if builder is None:
+        return
+    api = builder.scope.api
+    api.begin_test(builder)
+    request.addfinalizer(lambda: api.rollback_test(builder))
+
+
 @pytest.fixture
 def req(request):
-    return marks.get(request.function, 'req')
+    builder = marks.get(request.function, 'req_builder')
+    # the request is built on demand and dropped once the test has run
+    request.addfinalizer(builder.release)
+    return builder.build()
 
 
 @pytest.fixture
@@ -0,0 +1,48 @@
+"""pytest-xdist scheduling for Ra.
+
+Tests in a resource scope rely on running in order (POST first, DELETE
+last), so they must not be split across workers. ``ResourceScopeScheduling``
+distributes whole resource subtrees (see ``ra.plugins.pytest_.scope_unit``)
+as work units, longest first according to the durations recorded on
+previous runs.
+"""
+from xdist.scheduler import LoadScopeScheduling
+
+from .pytest_ import DURATIONS_KEY, scope_unit
+
+
+class ResourceScopeScheduling(LoadScopeScheduling):
+    def __init__(self, config, log=None):
+        super(ResourceScopeScheduling, self).__init__(config, log)
+        cache = getattr(config, 'cache', None)
+        self.durations = cache.get(DURATIONS_KEY, {}) if cache else {}
+        self._ordered = False
+
+    def _split_scope(self, nodeid):
+        return scope_unit(nodeid)
+
+    def estimate(self, unit, nodeids):
+        """Estimated duration of a work unit: its recorded duration, or its
+        number of tests times the mean recorded duration per test for units
+        that haven't run before."""
+        if unit in self.durations:
+            return self.durations[unit]
+        return len(nodeids) * self._mean_test_duration
+
+    def _order_workqueue(self):
+        recorded = [(self.durations[unit], len(nodeids)) for unit, nodeids
+                    in self.workqueue.items() if unit in self.durations]
+        total_duration = sum(duration for duration, _ in recorded)
+        total_tests = sum(tests for _, tests in recorded)
+        self._mean_test_duration = (total_duration / total_tests
+                                    if total_duration else 1.0)
+        units = sorted(self.workqueue.items(),
+                       key=lambda unit: -self.estimate(*unit))
+        self.workqueue.clear()
+        self.workqueue.update(units)
+
+    def _assign_work_unit(self, node):
+        if not self._ordered:
+            self._order_workqueue()
+            self._ordered = True
+        super(ResourceScopeScheduling, self)._assign_work_unit(node)
@@ -1,19 +1,51 @@
 """
 This module provides a parse function for parsing RAML with ramlfications,
 as well as wrapper classes for the main ramlfications types to make
-them more pleasant to work with.
+them more pleasant to work with, and an optional compact node model
+holding only what Ra uses.
 """
 import collections
 import re
+import jsonschema
+import simplejson as json
 import six
 import ramlfications
 import wrapt
+from .timing import LatencyBudget
 from .utils import list_to_dict
 
 
-def parse(raml_path_or_string):
-    root = ramlfications.parse(raml_path_or_string)
-    return RootNode(root)
+def parse(raml_path_or_string, cache_dir=None, compact=False):
+    """Parse RAML and wrap it in a ``RootNode``.
+
+    If :cache_dir: is given (or a default was set with
+    ``ra.cache.set_default_dir``) and a file path is passed, the parsed
+    result is cached on disk, keyed by the contents of the file and its
+    includes.
+
+    If :compact: is True, the result is converted to the compact node model
+    (see ``compact``) and the ramlfications tree is dropped.
+    """
+    from . import cache
+
+    def _parse():
+        root = RootNode(ramlfications.parse(raml_path_or_string))
+        return compact_root(root) if compact else root
+
+    if cache_dir is None:
+        cache_dir = cache.get_default_dir()
+    if cache_dir is None or is_raml(raml_path_or_string):
+        return _parse()
+
+    variant = 'compact' if compact else None
+    key = cache.cache_key(raml_path_or_string)
+    root = cache.load(raml_path_or_string, cache_dir, key=key,
+                      variant=variant)
+    if root is None:
+        root = _parse()
+        cache.dump(root, raml_path_or_string, cache_dir, key=key,
+                   variant=variant)
+    return root
 
 
 def is_raml(s):
@@ -39,11 +71,48 @@ def resource_name_from_path(path, singularize=True):
     """
     parts = STRIP_DYNAMIC.sub('', path.strip('/')).split('/')
     if singularize:
-        import inflection
-        parts = (inflection.singularize(part) for part in parts)
+        parts = (_singularize(part) for part in parts)
     return '.'.join(parts)
 
 
+_singular_forms = {}
+
+def _singularize(word):
+    "Singularize :word: with inflection, caching the result."
+    try:
+        return _singular_forms[word]
+    except KeyError:
+        import inflection
+        singular = _singular_forms[word] = inflection.singularize(word)
+        return singular
+
+
+class ResourceNames(object):
+    """Index of resource names (see ``resource_name_from_path``) for the
+    resource paths of a RAML document, computed once when it's parsed.
+
+    ``names`` maps each path to its name, and ``paths`` maps each name to
+    the paths sharing it (e.g. 'user' to "/users" and "/users/{username}").
+    """
+    def __init__(self, paths):
+        self.names = collections.OrderedDict()
+        self.paths = collections.OrderedDict()
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        name = self.names[path] = resource_name_from_path(path)
+        self.paths.setdefault(name, []).append(path)
+        return name
+
+    def name(self, path):
+        "Return the name for :path:, computing and adding it if needed."
+        try:
+            return self.names[path]
+        except KeyError:
+            return self.add(path)
+
+
 def uri_args_from_example(resource_node):
     """Recursively determine example values for any URI args
     in the resource path.
@@ -61,6 +130,96 @@ def uri_args_from_example(resource_node):
     return uri_args
 
 
+URI_PARAM = re.compile(r'\{([^{}]+)\}')
+
+class URIParameterError(ValueError):
+    pass
+
+
+class PathBuilder(object):
+    """Builds the path of a resource from a compiled URI template.
+
+    The template is split once into ``segments``, alternating literal text
+    and URI parameter names, so building a path is a single join.
+
+    :param template:    the path template, e.g. "/users/{username}"
+    :param defaults:    default URI parameter values (e.g. the RAML
+                        examples); None values don't count as defaults
+    """
+    def __init__(self, template, defaults=None):
+        self.template = template
+        self.segments = URI_PARAM.split(template)
+        self.params = tuple(self.segments[1::2])
+        self.defaults = dict(defaults or {})
+        self.required = tuple(name for name in self.params
+                              if self.defaults.get(name) is None)
+
+    def bind(self, prefix='', **defaults):
+        """Return a builder for this template with :prefix: prepended and
+        :defaults: added to (and overriding) its defaults."""
+        args = dict(self.defaults)
+        args.update(defaults)
+        return PathBuilder(prefix + self.template, args)
+
+    def missing(self, args=None):
+        "Return the required parameters not given in :args:."
+        args = args or {}
+        return [name for name in self.required if args.get(name) is None]
+
+    def build(self, args=None):
+        """Return the path with parameters filled in from :args: and the
+        defaults. Raises ``URIParameterError`` naming any missing ones."""
+        if not self.params:
+            return self.template
+        if args:
+            values = dict(self.defaults)
+            values.update(args)
+        else:
+            values = self.defaults
+        segments = list(self.segments)
+        try:
+            for i in range(1, len(segments), 2):
+                value = values[segments[i]]
+                if value is None:
+                    raise KeyError(segments[i])
+                segments[i] = str(value)
+        except KeyError:
+            raise URIParameterError(
+                "No value for URI parameter(s) {} of {}: pass them as "
+                "keyword arguments or declare an example in the RAML".format(
+                    ', '.join(self.missing(args)), self.template))
+        return ''.join(segments)
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(self.__class__.__name__,
+                                       self.template, self.defaults)
+
+
+def compile_path_builders(resources):
+    """Set a ``PathBuilder`` as ``path_builder`` on every node of
+    :resources: (as mapped by ``_map_resources``), with the URI parameter
+    examples of the resource and its parents as defaults."""
+    examples = {}
+
+    def example_args(node):
+        try:
+            return examples[node.path]
+        except KeyError:
+            pass
+        args = dict(example_args(node.parent)) if node.parent else {}
+        params = node.uri_params or {}
+        if isinstance(params, list):
+            params = list_to_dict(params, by='name')
+        for name, param in six.iteritems(params):
+            args[name] = param.example
+        examples[node.path] = args
+        return args
+
+    for path, nodes in six.iteritems(resources):
+        for node in nodes.values():
+            node.path_builder = PathBuilder(path, example_args(node))
+
+
 def resource_full_path(path, parent=None):
     if parent is None:
         return path
@@ -93,18 +252,131 @@ def named_params_to_json_schema(params):
     return schema
 
 
-class RootNode(wrapt.ObjectProxy):
-    "Wraps a ``ramlfications.raml.RootNode and its contained objects``"
+_schema_validators = {}
+
+def compile_schema(schema):
+    """Check a JSON schema against its metaschema and return a reusable
+    validator instance for it.
+
+    Validators are cached by the canonical JSON form of the schema, so
+    identical schemas declared on several responses are only checked and
+    compiled once. Raises ``jsonschema.SchemaError`` for invalid schemas.
+    """
+    key = json.dumps(schema, sort_keys=True)
+    try:
+        return _schema_validators[key]
+    except KeyError:
+        pass
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = _schema_validators[key] = cls(schema)
+    return validator
+
+
+HeaderCheck = collections.namedtuple(
+    'HeaderCheck', 'name key type convert required validator error')
+
+
+def _to_boolean(value):
+    return {'true': True, 'false': False}.get(value, value)
+
+
+HEADER_CONVERTERS = {
+    'number': float,
+    'integer': int,
+    'boolean': _to_boolean,
+}
+
+
+def compile_header_plan(headers):
+    """Build a list of ``HeaderCheck`` tuples for the RAML headers declared
+    on a response (mapped by name).
+
+    Each check holds the lower-cased header name to look up, a converter for
+    the declared type, whether the header is required and a compiled
+    validator for the remaining named parameter constraints (or None if the
+    type conversion is all there is to check). Headers that can't be
+    translated to JSON schema carry an ``error`` message instead, raised when
+    a response is validated.
+    """
+    plan = []
+    for name, header in six.iteritems(headers):
+        props = dict(header.raw[header.name])
+        try:
+            schema = named_params_to_json_schema(props)
+        except KeyError as ex:
+            plan.append(HeaderCheck(name, name.lower(), None, None, False,
+                                    None, 'Missing required RAML named '
+                                    'parameter: {}'.format(ex)))
+            continue
+        required = bool(schema.pop('required', False))
+        type_ = schema['type']
+        validator = None
+        if len(schema) > 1 or type_ not in HEADER_CONVERTERS:
+            schema['$schema'] = 'http://json-schema.org/draft-04/schema'
+            validator = compile_schema(schema)
+        elif type_ == 'boolean':
+            validator = compile_schema({'type': 'boolean'})
+        plan.append(HeaderCheck(name, name.lower(), type_,
+                                HEADER_CONVERTERS.get(type_), required,
+                                validator, None))
+    return plan
+
+
+LATENCY_BUDGET_ANNOTATION = '(latencyBudget)'
+
+def latency_budget_from_raml(node):
+    "Return the ``LatencyBudget`` annotated on a method node, if any."
+    method_raw = (node.raw or {}).get(node.method) or {}
+    value = method_raw.get(LATENCY_BUDGET_ANNOTATION)
+    if value is None:
+        return None
+    return LatencyBudget.from_raml(value)
+
+
+def _restore_node(cls, wrapped):
+    """Unpickle a node wrapper.
+
+    The mapped attributes live on the wrapped ramlfications object, so only
+    the compiled (unpicklable) state has to be rebuilt.
+    """
+    node = cls.__new__(cls)
+    wrapt.ObjectProxy.__init__(node, wrapped)
+    node._compile()
+    return node
+
+
+class _Node(wrapt.ObjectProxy):
+    "Base class for the node wrappers, making them picklable."
+    def _compile(self):
+        pass
+
+    def __reduce_ex__(self, protocol):
+        return _restore_node, (type(self), self.__wrapped__)
+
+
+class RootNode(_Node):
+    """Wraps a ``ramlfications.raml.RootNode and its contained objects``
+
+    Resources are mapped by path and method in ``resources``, and their
+    names are indexed in ``resource_names`` (a ``ResourceNames``). Each
+    resource node gets a ``path_builder`` (a ``PathBuilder``).
+    """
     def __init__(self, wrapped):
         super(RootNode, self).__init__(wrapped)
 
         self.resources = _map_resources(ResourceNode(r)
                                        for r in wrapped.resources)
+        self.resource_names = ResourceNames(self.resources)
+        compile_path_builders(self.resources)
 
 
-class ResourceNode(wrapt.ObjectProxy):
+class ResourceNode(_Node):
     """Wraps a ``ramlfications.raml.ResourceNode`` to map parameters, bodies and
     responses by a sensible key.
+
+    A ``(latencyBudget)`` annotation on the method is read into
+    ``latency_budget`` (see ``ra.timing.LatencyBudget.from_raml``).
     """
     def __init__(self, wrapped):
         super(ResourceNode, self).__init__(wrapped)
@@ -118,16 +390,171 @@ class ResourceNode(wrapt.ObjectProxy):
         self.responses        =  list_to_dict((Response(r) for r
                                                in (wrapped.responses or [])),
                                                by='code')
+        self.latency_budget   =  latency_budget_from_raml(wrapped)
 
 
-class Response(wrapt.ObjectProxy):
+class Response(_Node):
     """Wraps a ``ramlfications.raml.Response`` to map headers and body by
-    a sensible key."""
+    a sensible key.
+
+    JSON schemas declared for the response body are compiled into
+    validators up front (keyed by mime type), so schema errors surface when
+    the RAML is parsed rather than when a response is validated. Declared
+    headers are likewise compiled into a ``header_plan``.
+    """
     def __init__(self, wrapped):
         super(Response, self).__init__(wrapped)
 
         self.headers = list_to_dict(wrapped.headers, by='name')
         self.body    = list_to_dict(wrapped.body, by='mime_type')
+        self._compile()
+
+    def _compile(self):
+        # stored on the proxy itself, so they aren't pickled with the
+        # wrapped object
+        self._self_validators = {
+            mime_type: compile_schema(body.schema)
+            for mime_type, body in six.iteritems(self.body)
+            if isinstance(body.schema, dict)}
+        self._self_header_plan = compile_header_plan(self.headers)
+
+    @property
+    def validators(self):
+        return self._self_validators
+
+    @property
+    def header_plan(self):
+        return self._self_header_plan
+
+
+class _CompactNode(object):
+    """Base class for the compact node model: records with ``__slots__``,
+    holding only what Ra uses from the RAML.
+
+    Attributes are passed as keyword arguments (missing ones are None).
+    Compiled state (see ``_compile``) isn't pickled but rebuilt on load.
+    """
+    __slots__ = ()
+    _compiled = ()
+
+    def __init__(self, **attrs):
+        for name in self.__slots__:
+            setattr(self, name, attrs.get(name))
+        self._compile()
+
+    def _compile(self):
+        pass
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__
+                    if name not in self._compiled)
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            setattr(self, name, state.get(name))
+        self._compile()
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__,
+                                getattr(self, self.__slots__[0]))
+
+
+class CompactParam(_CompactNode):
+    "A named parameter (URI/query/form parameter or header)."
+    __slots__ = ('name', 'type', 'example', 'default', 'required',
+                 'description', 'raw')
+
+
+class CompactBody(_CompactNode):
+    __slots__ = ('mime_type', 'schema', 'example', 'form_params')
+
+
+class CompactResponse(_CompactNode):
+    __slots__ = ('code', 'description', 'headers', 'body',
+                 'validators', 'header_plan')
+    _compiled = ('validators', 'header_plan')
+
+    def _compile(self):
+        self.validators = {
+            mime_type: compile_schema(body.schema)
+            for mime_type, body in six.iteritems(self.body or {})
+            if isinstance(body.schema, dict)}
+        self.header_plan = compile_header_plan(self.headers or {})
+
+
+class CompactResource(_CompactNode):
+    __slots__ = ('path', 'method', 'display_name', 'description', 'parent',
+                 'uri_params', 'base_uri_params', 'query_params',
+                 'form_params', 'headers', 'body', 'responses',
+                 'latency_budget', 'path_builder')
+
+
+class CompactRoot(_CompactNode):
+    __slots__ = ('title', 'version', 'base_uri', 'media_type', 'resources',
+                 'resource_names')
+
+
+def _compact_params(params):
+    return dict((name, CompactParam(
+        name=param.name, type=param.type, example=param.example,
+        default=param.default, required=param.required,
+        description=param.description, raw=param.raw))
+        for name, param in six.iteritems(params or {}))
+
+
+def _compact_bodies(bodies):
+    return dict((mime_type, CompactBody(
+        mime_type=mime_type, schema=body.schema, example=body.example,
+        form_params=_compact_params(list_to_dict(body.form_params))))
+        for mime_type, body in six.iteritems(bodies or {}))
+
+
+def compact_root(root):
+    """Convert a ``RootNode`` to the compact node model.
+
+    The result has the same mapped attributes Ra uses (``resources``, and
+    on resource nodes ``uri_params``, ``body``, ``responses`` and so on),
+    but holds no references to the ramlfications objects, which can be
+    garbage collected.
+    """
+    compacted = {}
+    resources = collections.OrderedDict()
+    for path, nodes in six.iteritems(root.resources):
+        methods = resources[path] = collections.OrderedDict()
+        for method, node in six.iteritems(nodes):
+            methods[method] = compacted[id(node.__wrapped__)] = \
+                CompactResource(
+                    path=node.path, method=node.method,
+                    display_name=node.display_name,
+                    description=_description(node),
+                    parent=node.parent,
+                    uri_params=_compact_params(node.uri_params),
+                    base_uri_params=_compact_params(node.base_uri_params),
+                    query_params=_compact_params(node.query_params),
+                    form_params=_compact_params(node.form_params),
+                    headers=_compact_params(node.headers),
+                    body=_compact_bodies(node.body),
+                    responses=dict((code, CompactResponse(
+                        code=code, description=_description(response),
+                        headers=_compact_params(response.headers),
+                        body=_compact_bodies(response.body)))
+                        for code, response in six.iteritems(node.responses)),
+                    latency_budget=node.latency_budget,
+                    path_builder=node.path_builder)
+    for nodes in resources.values():
+        for node in nodes.values():
+            node.parent = compacted.get(id(node.parent))
+
+    return CompactRoot(title=root.title, version=root.version,
+                       base_uri=root.base_uri, media_type=root.media_type,
+                       resources=resources,
+                       resource_names=root.resource_names)
+
+
+def _description(node):
+    description = getattr(node, 'description', None)
+    # ramlfications wraps descriptions in an object rendering markdown
+    return getattr(description, 'raw', description)
 
 
 def _map_resources(resources):
@@ -0,0 +1,98 @@
+"""
+Readiness strategies used by autotests to wait for the backend after
+requests that write data.
+
+A strategy is a callable taking the request and its response. It returns
+once the backend is ready for the next request, or raises ``WaitTimeout``.
+"""
+import threading
+import time
+
+
+WRITE_METHODS = frozenset(['POST', 'PUT', 'PATCH', 'DELETE'])
+
+
+class WaitTimeout(Exception):
+    pass
+
+
+class WaitStats(object):
+    "Accumulates time spent waiting for readiness over a test session."
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.total += seconds
+            self.count += 1
+
+
+stats = WaitStats()
+
+
+def wait_until(condition, timeout=5.0, delay=0.01, backoff=2.0,
+               max_delay=1.0):
+    """Call :condition: until it returns a truthy value, sleeping in between
+    with exponential backoff (starting at :delay: seconds and multiplied by
+    :backoff: up to :max_delay:).
+
+    Raises ``WaitTimeout`` if :condition: isn't met within :timeout: seconds.
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise WaitTimeout("Condition not met within {} seconds"
+                              .format(timeout))
+        time.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
+
+def poll(condition, **wait_params):
+    """Strategy polling ``condition(req, resp)`` until it's truthy.
+
+    :param wait_params: passed to ``wait_until`` (timeout, delay, ...)
+    """
+    def strategy(req, resp):
+        wait_until(lambda: condition(req, resp), **wait_params)
+    return strategy
+
+
+def sleep(seconds):
+    "Strategy sleeping a fixed number of seconds."
+    def strategy(req, resp):
+        time.sleep(seconds)
+    return strategy
+
+
+def get_until_visible(**wait_params):
+    """Strategy polling with GET requests until a write is visible.
+
+    After a DELETE, waits until the resource returns 404. After other
+    writes, waits until the resource (the response's ``Location`` header if
+    set, or else the request URL) returns a successful status.
+    """
+    def condition(req, resp):
+        app = req.scope.app
+        if req.method.upper() == 'DELETE':
+            check = app.get(req.url, expect_errors=True)
+            return check.status_int == 404
+        url = resp.headers.get('Location') or req.url
+        check = app.get(url, expect_errors=True)
+        return check.status_int < 400
+    return poll(condition, **wait_params)
+
+
+def elasticsearch_refresh(es_url='http://localhost:9200', index='_all',
+                          timeout=5.0):
+    """Strategy calling Elasticsearch's ``_refresh`` API so indexed writes
+    are searchable before the next request."""
+    from six.moves.urllib.request import Request, urlopen
+
+    refresh_url = '{}/{}/_refresh'.format(es_url.rstrip('/'), index)
+
+    def strategy(req, resp):
+        urlopen(Request(refresh_url, data=b''), timeout=timeout).close()
+    return strategy
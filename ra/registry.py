@@ -0,0 +1,66 @@
+"""
+Process-wide registry of parsed RAML and loaded apps, shared by the
+``APISuite`` objects of a test session.
+
+Test modules calling ``ra.api()`` with the same RAML file and app config
+get the same parsed RAML (memoized by resolved path and the mtimes of the
+file and the files it ``!include``s) and
+the same ``webtest.TestApp`` (memoized by config URI or URL), rather than
+parsing the RAML and loading the app once per module. Pass ``shared=False``
+to ``ra.api()`` for a suite that needs its own.
+
+The pytest plugin clears the registry when the session ends.
+"""
+import os
+import threading
+import webtest
+from . import cache
+
+
+_lock = threading.Lock()
+_raml = {}
+_apps = {}
+
+
+def get_raml(raml_path, parse, compact=False):
+    """Return the parsed RAML for file :raml_path:, calling
+    ``parse(raml_path)`` if it isn't registered or the file or one of the
+    files it includes has been modified since it was."""
+    path = os.path.abspath(raml_path)
+    if not os.path.exists(path):
+        return parse(raml_path)
+    mtimes = tuple(_mtime(name) for name in cache.raml_files(path))
+    key = (path, compact)
+    with _lock:
+        entry = _raml.get(key)
+        if entry is not None and entry[0] == mtimes:
+            return entry[1]
+        root = parse(raml_path)
+        _raml[key] = (mtimes, root)
+        return root
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def get_app(app, relative_to):
+    """Return the ``webtest.TestApp`` for :app:, a Paste Deploy config URI
+    (like 'config:test.ini') or URL, loading it on first use."""
+    key = (app, relative_to if app.startswith('config:') else None)
+    with _lock:
+        test_app = _apps.get(key)
+        if test_app is None:
+            test_app = _apps[key] = webtest.TestApp(app,
+                                                    relative_to=relative_to)
+        return test_app
+
+
+def clear():
+    "Forget all registered RAML and apps."
+    with _lock:
+        _raml.clear()
+        _apps.clear()
@@ -1,11 +1,13 @@
 import fnmatch
+import re
 import simplejson as json
 import webtest
+from . import codec, timing
 from .utils import listify
 from .validate import RAMLValidator
 
 
-def make_request_class(app, base=None):
+def make_request_class(app, base=None, json_codec=None):
     """Create a callable, app-bound request class from a base request class.
 
     Request objects built from this class are passed to test functions.
@@ -17,11 +19,25 @@ def make_request_class(app, base=None):
     the request to send, applying any additional request parameters passed.
     It also takes a ``validate`` keyword to determine if RAML validation
     assertions should be automatically made on the response before
-    returning it (default is True).
+    returning it (default is True). It can also be a list of the parts to
+    validate, or a validation policy like ``ra.validate.SampleItems``.
+
+    Each call records the time spent building, dispatching and validating
+    the request (see ``ra.timing``) as ``resp.timings``, also added to the
+    list in ``req.timings``.
+
+    If the request has a ``latency_budget`` (a ``ra.timing.LatencyBudget``,
+    set from the test declaration or the RAML, or passed as a keyword to
+    the call), the call fails when the app takes longer than the budget
+    allows.
 
     The request object expects to be assigned a ``raml`` attribute with
     the ra.raml.ResourceNode to validate against as the value.
 
+    If :app: also has an ``arequest`` coroutine method (like
+    ``ra.aio.AsyncApp``), the request object has an awaitable counterpart,
+    ``req.areq(validate=True, **req_params)``.
+
     :param app:         the app we want to make requests to, generally an
                         instance of ``webtest.TestApp`` but can be anything
                         that responds to request() taking a webob-like request
@@ -29,6 +45,8 @@ def make_request_class(app, base=None):
                         request parameters as keyword args.
     :param base:        the base request class
                         (default ``webtest.TestRequest``).
+    :param json_codec:  a ``ra.codec.JSONCodec`` to encode request data and
+                        decode JSON responses with (default simplejson)
 
     :return:    a new class for callable requests bound to :app: and pre-set
                 with :req_params:
@@ -37,19 +55,42 @@ def make_request_class(app, base=None):
         base = webtest.TestRequest
 
     ResponseClass = getattr(base, 'ResponseClass', webtest.TestResponse)
+    if json_codec is not None and \
+            not isinstance(json_codec, codec.SimpleJSONCodec):
+        ResponseClass = codec.make_response_class(ResponseClass, json_codec)
 
-    def __call__(self, validate=True, **req_params):
-        resp = app.request(self, **req_params)
-        if validate:
-            RAMLValidator(resp, self.raml).validate(validate)
+    def send(self, validate, req_params):
+        timings = start_timings(self)
+        resp = None
+        try:
+            start = timing.clock()
+            resp = app.request(self, **req_params)
+            timings['dispatch'] = timing.clock() - start
+            if validate:
+                validate_response(self, resp, validate, timings)
+        finally:
+            timing.record(self, resp, timings)
         return resp
 
+    def __call__(self, validate=True, latency_budget=None, **req_params):
+        budget = latency_budget or self.latency_budget
+        if budget is None:
+            return send(self, validate, req_params)
+        return check_latency(self, budget,
+                             lambda validate: send(self, validate, req_params),
+                             validate)
+
     def encode_data(self, JSONEncoder=None):
         if JSONEncoder is None:
             JSONEncoder = self.JSONEncoder
-        import codecs
-        self.body = codecs.encode(json.dumps(self.data, cls=JSONEncoder),
-                                  'utf-8')
+        # the suite's codec encodes with the suite's JSONEncoder; an encoder
+        # set on the request (or passed here) overrides both
+        default = (self.scope.api.JSONEncoder if self.scope is not None
+                   else None)
+        if self.json_codec is not None and JSONEncoder in (None, default):
+            self.body = self.json_codec.dumps(self.data)
+            return
+        self.body = json.dumps(self.data, cls=JSONEncoder).encode('utf-8')
 
     def match(self, only=None, exclude=None):
         """Returns True if this request's method and path match conditions.
@@ -76,31 +117,81 @@ def make_request_class(app, base=None):
             'raml': None,
             'scope': None,
             'JSONEncoder': None,
+            'json_codec': json_codec,
+            'sampling': None,
+            'build_time': None,
+            'timings': None,
+            'latency_budget': None,
+            'case': None,
             '__call__': __call__,
             'encode_data': encode_data,
             'match': match,
             'ResponseClass': ResponseClass
         })
 
+    if hasattr(app, 'arequest'):
+        from .aio import make_areq
+        RequestClass.areq = make_areq(app)
+
     return RequestClass
 
 
+def start_timings(req):
+    """Return the timings dict for a call of :req:, with the time it took to
+    build the request if this is its first call."""
+    timings = {}
+    if req.build_time is not None:
+        timings['build'], req.build_time = req.build_time, None
+    return timings
+
+
+def check_latency(req, budget, send, validate):
+    """Send :req: as many times as :budget: asks for, with ``send(validate)``,
+    and check the dispatch times against it. Returns the last response."""
+    for _ in range(budget.warmup):
+        send(False)
+    latencies = []
+    for _ in range(budget.runs):
+        resp = send(validate)
+        latencies.append(resp.timings['dispatch'])
+    budget.check(latencies, timing.endpoint(req))
+    return resp
+
+
+def validate_response(req, resp, validate, timings=None):
+    """Validate :resp: against the RAML of :req:.
+
+    When the validation policy sampled array items, the ``(validated,
+    total)`` item counts are set as ``resp.sampling`` and added to the list
+    in ``req.sampling``. If a :timings: dict is passed, the time spent
+    validating each part is added to it.
+    """
+    validator = RAMLValidator(resp, req.raml)
+    try:
+        validator.validate(validate)
+    finally:
+        if timings is not None:
+            timings.update(validator.timings)
+    if validator.sampling is not None:
+        resp.sampling = validator.sampling
+        req.sampling = (req.sampling or []) + [validator.sampling]
+
+
 def _match_request(path, method, only=None, exclude=None):
     only, exclude = listify(only), listify(exclude)
 
     if only:
-        if not any(_condition_match(pattern, method, path)
-                   for pattern in only):
+        if not _compile_patterns(only).match(method, path):
             return False
     if exclude:
-        if any(_condition_match(pattern, method, path)
-               for pattern in exclude):
+        if _compile_patterns(exclude).match(method, path):
             return False
     return True
 
 
-def _condition_match(pattern, method, path):
-    """Check if method and path of request match condition pattern.
+def _split_pattern(pattern):
+    """Split a condition pattern into a (METHOD, path glob) pair, either of
+    which can be None.
     """
     if ' ' in pattern:
         pmethod, ppath = pattern.split(' ', 1)
@@ -108,13 +199,69 @@ def _condition_match(pattern, method, path):
         pmethod, ppath = None, pattern
     else:
         pmethod, ppath = pattern, None
+    return (pmethod.upper() if pmethod else None), (ppath or None)
 
-    if pmethod:
-        if pmethod.upper() != method.upper():
-            return False
 
-    if ppath:
-        if not fnmatch.fnmatch(path, ppath):
-            return False
+class PatternSet(object):
+    """A set of condition patterns compiled for matching requests.
 
-    return True
+    Path globs are grouped by method and compiled into one regex per method
+    (including the globs that apply to any method), so matching costs a
+    dict lookup and a single regex match however many patterns there are.
+    """
+    def __init__(self, patterns):
+        any_method = []
+        by_method = {}
+        self.all_paths = set() # methods matching any path
+        self.match_all = False
+
+        for pattern in patterns:
+            pmethod, ppath = _split_pattern(pattern)
+            if ppath is None:
+                if pmethod is None:
+                    self.match_all = True
+                else:
+                    self.all_paths.add(pmethod)
+            elif pmethod is None:
+                any_method.append(fnmatch.translate(ppath))
+            else:
+                by_method.setdefault(pmethod, []).append(
+                    fnmatch.translate(ppath))
+
+        self.any_method = _combine(any_method)
+        self.by_method = {pmethod: _combine(globs + any_method)
+                          for pmethod, globs in by_method.items()}
+
+    def match(self, method, path):
+        "Return True if any pattern matches :method: and :path:"
+        if self.match_all:
+            return True
+        method = method.upper()
+        if method in self.all_paths:
+            return True
+        regex = self.by_method.get(method, self.any_method)
+        return regex is not None and regex.match(path) is not None
+
+
+def _combine(regexes):
+    if not regexes:
+        return None
+    return re.compile('|'.join('(?:{})'.format(r) for r in regexes))
+
+
+_pattern_sets = {}
+
+def _compile_patterns(patterns):
+    "Return the (cached) ``PatternSet`` for a list of condition patterns."
+    key = tuple(patterns)
+    try:
+        return _pattern_sets[key]
+    except KeyError:
+        pattern_set = _pattern_sets[key] = PatternSet(key)
+        return pattern_set
+
+
+def _condition_match(pattern, method, path):
+    """Check if method and path of request match condition pattern.
+    """
+    return _compile_patterns([pattern]).match(method, path)
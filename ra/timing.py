@@ -0,0 +1,131 @@
+"""
+Per-request timing instrumentation.
+
+Each call of a request object records how long each phase of the request
+took, in seconds:
+
+* ``build``:            building the request (calling its factory and
+                        encoding the body), on the first call only
+* ``dispatch``:         the app handling the request
+* ``validate_headers``: validating response headers against the RAML
+* ``validate_body``:    validating the response body against the RAML
+
+The timings are set as ``resp.timings`` and added to the list in
+``req.timings``. The pytest plugin adds them to the test reports and
+summarizes them per endpoint (``METHOD /path``).
+"""
+import math
+import timeit
+
+
+clock = timeit.default_timer
+
+PHASES = ('build', 'dispatch', 'validate_headers', 'validate_body')
+
+
+def record(req, resp, timings):
+    "Attach the :timings: of a call of :req: to it and its response :resp:."
+    if resp is not None:
+        resp.timings = timings
+    req.timings = (req.timings or []) + [timings]
+
+
+def endpoint(req):
+    """Return the ``METHOD /path`` endpoint of :req:, using the resource path
+    of its scope (before URI parameters are filled in) if it has one."""
+    scope = getattr(req, 'scope', None)
+    path = scope.path if scope is not None else req.path
+    return '{} {}'.format(req.method.upper(), path)
+
+
+def total(timings):
+    return sum(timings.get(phase, 0.0) for phase in PHASES)
+
+
+def percentile(values, pct):
+    "Return the :pct: percentile of sorted :values: (nearest rank)."
+    if not values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def summarize(records):
+    """Summarize ``(endpoint, timings)`` pairs per endpoint.
+
+    Returns a list of dicts with the endpoint and the count, mean, p50, p95
+    and max of its total request times, slowest (by mean) first.
+    """
+    by_endpoint = {}
+    for name, timings in records:
+        by_endpoint.setdefault(name, []).append(total(timings))
+
+    rows = []
+    for name, totals in by_endpoint.items():
+        totals.sort()
+        rows.append({
+            'endpoint': name,
+            'count': len(totals),
+            'mean': sum(totals) / len(totals),
+            'p50': percentile(totals, 50),
+            'p95': percentile(totals, 95),
+            'max': totals[-1],
+        })
+    rows.sort(key=lambda row: -row['mean'])
+    return rows
+
+
+class LatencyBudgetExceeded(AssertionError):
+    pass
+
+
+class LatencyBudget(object):
+    """A limit on how long the app may take to handle a request.
+
+    The request is first sent :warmup: times (without validation), then
+    :runs: times. The :percentile: of the dispatch times of those runs must
+    not exceed :max_ms: milliseconds, so with several runs a single slow
+    call doesn't fail the test. By default the request is sent once and its
+    time is checked.
+
+    Budgets with several runs send the request repeatedly, so they are best
+    used with idempotent methods.
+    """
+    def __init__(self, max_ms, percentile=100, runs=1, warmup=0):
+        if runs < 1:
+            raise ValueError("A latency budget needs at least one run")
+        self.max_ms = max_ms
+        self.percentile = percentile
+        self.runs = runs
+        self.warmup = warmup
+
+    @classmethod
+    def from_raml(cls, value):
+        """Make a budget from a ``(latencyBudget)`` RAML annotation: either
+        the maximum in milliseconds, or a mapping with ``maxMs`` and
+        optionally ``percentile``, ``runs`` and ``warmup``."""
+        if isinstance(value, dict):
+            return cls(value['maxMs'],
+                       percentile=value.get('percentile', 100),
+                       runs=value.get('runs', 1),
+                       warmup=value.get('warmup', 0))
+        return cls(value)
+
+    def check(self, latencies, endpoint=''):
+        """Raise ``LatencyBudgetExceeded`` if the budget's percentile of
+        :latencies: (in seconds) is over budget."""
+        observed = percentile(sorted(latencies), self.percentile) * 1000
+        if observed > self.max_ms:
+            if len(latencies) > 1:
+                measured = 'p{} latency over {} runs'.format(
+                    self.percentile, len(latencies))
+            else:
+                measured = 'latency'
+            raise LatencyBudgetExceeded(
+                '{} {} was {:.1f}ms, over its budget of {}ms'.format(
+                    endpoint, measured, observed, self.max_ms).strip())
+
+    def __repr__(self):
+        return ('{}(max_ms={!r}, percentile={!r}, runs={!r}, warmup={!r})'
+                .format(self.__class__.__name__, self.max_ms,
+                        self.percentile, self.runs, self.warmup))
@@ -2,6 +2,7 @@ import random
 import re
 import six
 from string import ascii_letters
+from six.moves.urllib.parse import urlencode
 
 
 def path_from_uri(uri):
@@ -1,79 +1,272 @@
+import codecs
+import io
+import random
 import jsonschema
-from .raml import named_params_to_json_schema
+import simplejson as json
+from .timing import clock
+
+
+# response bodies larger than this many bytes are validated as a stream
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+# top-level keywords of an array schema that can be checked item by item
+# (while streaming or sampling its items)
+ITEMWISE_KEYWORDS = frozenset(['$schema', 'id', '$id', 'title',
+                                 'description', 'definitions', 'type',
+                                 'items', 'minItems', 'maxItems'])
+
+
+class SampleItems(object):
+    """Validation policy for large array bodies: validate the first :first:
+    items, and a random sample of the others (each one with probability
+    :rate:), seeded with :seed: so runs are repeatable.
+
+    Bodies that aren't arrays of items are validated in full. Pass
+    instances as ``validate`` to ``RAMLValidator.validate`` or ``req()``.
+
+    :param parts:   the parts of the response to validate, like the
+                    ``validate`` argument (default: headers and body)
+    """
+    def __init__(self, first=100, rate=0.01, seed=0, parts=True):
+        self.first = first
+        self.rate = rate
+        self.seed = seed
+        self.parts = parts
+
+    def selector(self):
+        "Return a function telling if the item at an index is validated."
+        rng = random.Random(self.seed)
+
+        def selected(index):
+            return index < self.first or rng.random() < self.rate
+        return selected
+
+    def __repr__(self):
+        return '{}(first={}, rate={}, seed={})'.format(
+            self.__class__.__name__, self.first, self.rate, self.seed)
 
 
 class RAMLValidator(object):
-    def __init__(self, response, raml):
+    """Validates a response against the RAML for the request's resource.
+
+    :param stream_threshold:    JSON bodies larger than this many bytes
+                                whose schema is a plain array schema are
+                                parsed and validated item by item, instead
+                                of being loaded whole (default
+                                ``STREAM_THRESHOLD``)
+    """
+    def __init__(self, response, raml, stream_threshold=None):
         self.response = response
         self.raml = raml
-        self.raml_response = raml.responses.get(response.status_code)
+        self.raml_response = (raml.responses.get(response.status_code)
+                              if raml is not None else None)
+        if stream_threshold is None:
+            stream_threshold = STREAM_THRESHOLD
+        self.stream_threshold = stream_threshold
+        self.sampling = None
+        self.timings = {}
 
     def validate(self, validate=["headers", "body"]):
+        """Validate the response.
+
+        The time spent validating each part is recorded in ``self.timings``,
+        keyed "validate_headers" and "validate_body".
+
+        :param validate:    True, or a list of the parts to validate
+                            ("headers", "body"), or a validation policy
+                            like ``SampleItems``
+        """
         if self.raml is None:
             raise ValueError("Trying to validate with no RAML ResourceNode")
+        policy = None
+        if isinstance(validate, SampleItems):
+            policy, validate = validate, validate.parts
         if validate == True or "headers" in validate:
-            self.validate_headers()
+            self._timed('validate_headers', self.validate_headers)
         if validate == True or "body" in validate:
-            self.validate_body()
+            self._timed('validate_body', self.validate_body, policy)
+
+    def _timed(self, name, fn, *args):
+        start = clock()
+        try:
+            fn(*args)
+        finally:
+            self.timings[name] = clock() - start
 
-    def validate_body(self):
+    def validate_body(self, policy=None):
         try:
-            schema = self.raml_response.body['application/json'].schema
-        except (AttributeError, KeyError):
+            validator = self.raml_response.validators.get('application/json')
+        except AttributeError:
             return # RAML response bodies are optional
 
-        jsonschema.validate(self.response.json, schema)
+        if validator is None:
+            try:
+                schema = self.raml_response.body['application/json'].schema
+            except KeyError:
+                return
+            if schema is None:
+                return
+            jsonschema.validate(self.response.json, schema)
+        elif not _itemwise(validator.schema):
+            validator.validate(self.response.json)
+        elif self._should_stream():
+            self.validate_body_stream(validator, policy)
+        elif policy is not None:
+            body = self.response.json
+            if isinstance(body, list):
+                self.validate_items(validator, body, policy)
+            else:
+                validator.validate(body)
+        else:
+            validator.validate(self.response.json)
+
+    def _should_stream(self):
+        body = getattr(self.response, 'body', None)
+        return body is not None and len(body) > self.stream_threshold
+
+    def validate_body_stream(self, validator, policy=None):
+        """Validate a JSON array body against an array schema one item at a
+        time, so only one item is held in memory at once."""
+        items = iter_json_array(io.BytesIO(self.response.body))
+        self.validate_items(validator, items, policy)
+
+    def validate_items(self, validator, items, policy=None):
+        """Validate the :items: of an array body against the array schema of
+        :validator:, only checking the items selected by :policy: (if any).
+
+        Sets ``self.sampling`` to a ``(validated, total)`` pair of item
+        counts when a policy is used.
+        """
+        schema = validator.schema
+        items_schema = schema['items']
+        selected = policy.selector() if policy is not None else None
+        count = validated = 0
+        for index, item in enumerate(items):
+            count += 1
+            if selected is not None and not selected(index):
+                continue
+            validated += 1
+            for error in validator.descend(item, items_schema, path=index):
+                raise error
+
+        if policy is not None:
+            self.sampling = (validated, count)
+
+        if count < schema.get('minItems', 0):
+            raise jsonschema.ValidationError(
+                'Array has {} items, fewer than minItems ({})'.format(
+                    count, schema['minItems']))
+        if 'maxItems' in schema and count > schema['maxItems']:
+            raise jsonschema.ValidationError(
+                'Array has {} items, more than maxItems ({})'.format(
+                    count, schema['maxItems']))
 
     def validate_headers(self):
         try:
-            raml_headers_node = self.raml_response.headers
+            header_plan = self.raml_response.header_plan
         except AttributeError:
             return # RAML headers are optional
-        else:
-            raml_headers_raw = list(self.raml_response.headers.values())
 
-        raml_headers = {header.name: dict(header.raw[header.name])
-                        for header in raml_headers_raw}
-        http_headers = dict(self.response.headers)
+        if not header_plan:
+            return
 
-        for name, data in raml_headers.items():
-            self._validate_header(data, http_headers.get(name))
+        http_headers = {name.lower(): value for name, value
+                        in self.response.headers.items()}
 
-    def _validate_header(self, header_props, header_val):
-        try:
-            prop_schema = named_params_to_json_schema(header_props)
-        except KeyError as ex:
-            raise RAMLValidationError('Missing required RAML named parameter: '
-                                      '{}'.format(ex))
-        try:
-            header_val = _convert_type(prop_schema['type'], header_val)
-        except ValueError:
-            raise RAMLValidationError('Header value is not of type '
-                                      '`{}`'.format(prop_schema['type']))
-
-        required = prop_schema.pop('required', False)
-        json_schema = {
-            '$schema': 'http://json-schema.org/draft-04/schema',
-            'type': 'object',
-            'properties': {
-                'header': prop_schema
-            },
-        }
-        if required:
-            json_schema['required'] = ['header']
-        header = {} if header_val is None else {'header': header_val}
-        jsonschema.validate(header, json_schema)
-
-
-def _convert_type(type_, value):
-    booleans = {'true': True, 'false': False}
-    if type_ == 'number':
-        return float(value)
-    elif type_ == 'integer':
-        return int(value)
-    elif type_ == 'boolean':
-        return booleans.get(value, value)
-    return value
-
-
-class RAMLValidationError(object): pass
+        for check in header_plan:
+            self._validate_header(check, http_headers.get(check.key))
+
+    def _validate_header(self, check, header_val):
+        if check.error is not None:
+            raise RAMLValidationError(check.error)
+
+        if header_val is None:
+            if check.required:
+                raise RAMLValidationError('Missing required header '
+                                          '`{}`'.format(check.name))
+            return
+
+        if check.convert is not None:
+            try:
+                header_val = check.convert(header_val)
+            except ValueError:
+                raise RAMLValidationError('Header value is not of type '
+                                          '`{}`'.format(check.type))
+
+        if check.validator is not None:
+            check.validator.validate(header_val)
+
+
+class RAMLValidationError(Exception): pass
+
+
+def _itemwise(schema):
+    "True if :schema: is an array schema that can be checked item by item."
+    return (schema.get('type') == 'array' and
+            isinstance(schema.get('items'), dict) and
+            ITEMWISE_KEYWORDS.issuperset(schema))
+
+
+def iter_json_array(fileobj, chunk_size=64 * 1024, encoding='utf-8'):
+    """Incrementally parse a JSON array from the binary file :fileobj:,
+    yielding its items one by one.
+
+    Only the current item and up to a chunk of the remaining input are kept
+    in memory. Raises ``ValueError`` if the input isn't a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    reader = codecs.getincrementaldecoder(encoding)()
+    state = {'buf': '', 'eof': False}
+
+    def read(size=chunk_size):
+        data = fileobj.read(size)
+        state['eof'] = not data
+        state['buf'] += reader.decode(data, final=state['eof'])
+        return not state['eof']
+
+    def skip_whitespace(pos):
+        while True:
+            buf = state['buf']
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            if pos < len(buf) or not read():
+                return pos
+
+    pos = skip_whitespace(0)
+    if state['buf'][pos:pos + 1] != '[':
+        raise ValueError('Expected a JSON array')
+    pos = skip_whitespace(pos + 1)
+    if state['buf'][pos:pos + 1] == ']':
+        return
+
+    while True:
+        # decode the next item, reading more input while it's incomplete
+        # (a number at the end of the buffer may be cut off, too)
+        while True:
+            buf = state['buf']
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if state['eof']:
+                    raise
+                read(max(chunk_size, len(buf)))
+                continue
+            if end == len(buf) and not state['eof']:
+                read(max(chunk_size, len(buf)))
+                continue
+            break
+        yield item
+
+        pos = skip_whitespace(end)
+        delimiter = state['buf'][pos:pos + 1]
+        if delimiter == ']':
+            return
+        if delimiter != ',':
+            raise ValueError('Expected "," or "]" at offset {} of JSON '
+                             'array'.format(pos))
+        pos = skip_whitespace(pos + 1)
+
+        # drop what's been parsed
+        if pos > chunk_size:
+            state['buf'] = state['buf'][pos:]
+            pos = 0
@@ -42,6 +42,10 @@ setup(name='ra',
       include_package_data=True,
       zip_safe=False,
       install_requires=requires,
+      extras_require={
+          'async': ['aiohttp'],
+          'fastjson': ['orjson'],
+      },
       tests_require=requires,
       test_suite="ra",
       entry_points = {
@@ -16,3 +16,75 @@ def test_raml():
         else:
             return ramlpath
     return _test_raml
+
+
+@pytest.fixture
+def users_app():
+    """Return a function making a WSGI app for the "/users" resource.
+
+    ``users_app(status=None, calls=None, delay=None, fail=None)``: GET
+    returns a list of one user and POST echoes the request body with a 201.
+    Each request's ``(method, data, query)`` is appended to :calls:, and it
+    gets a 400 if ``fail(method, data, query)`` is true. :status: overrides
+    the status and :delay: is slept before responding.
+    """
+    import time
+    import simplejson as json
+    from six.moves.urllib.parse import parse_qs
+
+    def _users_app(status=None, calls=None, delay=None, fail=None):
+        def app(environ, start_response):
+            method = environ['REQUEST_METHOD']
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length) if length else b''
+            data = json.loads(body) if body else None
+            query = parse_qs(environ.get('QUERY_STRING', ''))
+            if calls is not None:
+                calls.append((method, data, query))
+            if delay:
+                time.sleep(delay)
+            if method == 'POST':
+                code, body = '201 Created', body or b'{"username": "earl"}'
+            else:
+                code, body = '200 OK', b'[{"username": "earl"}]'
+            if fail is not None and fail(method, data, query):
+                code, body = '400 Bad Request', b'{}'
+            start_response(status or code,
+                           [('Content-Type', 'application/json'),
+                            ('X-Total-Count', '1')])
+            return [body]
+        return app
+    return _users_app
+
+
+@pytest.fixture
+def declare_tests():
+    """Return a function declaring tests in a resource scope.
+
+    ``declare_tests(api, *verbs, path='/users', test_fn=None, **req_params)``
+    declares a test for each verb, passing :req_params: to the method
+    decorator, and returns their ``RequestBuilder`` objects. The tests call
+    ``test_fn(req)``, if given; the declared functions are in
+    ``builder.scope.members``, by verb.
+    """
+    from ra import marks
+
+    def _declare_tests(api, *verbs, **kwargs):
+        path = kwargs.pop('path', '/users')
+        test_fn = kwargs.pop('test_fn', None)
+
+        @api.resource(path)
+        def resource(scope):
+            pass
+
+        scope = api.resource_scopes[-1]
+        builders = []
+        for verb in verbs:
+            def test(req):
+                if test_fn is not None:
+                    test_fn(req)
+            test.__name__ = verb
+            declared = scope.method(verb, test, **kwargs)
+            builders.append(marks.get(declared, 'req_builder'))
+        return builders
+    return _declare_tests
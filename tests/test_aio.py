@@ -0,0 +1,78 @@
+import threading
+import pytest
+import webtest
+from six.moves import BaseHTTPServer, socketserver
+
+pytest.importorskip('aiohttp')
+
+from ra.aio import AsyncApp
+from ra.request import make_request_class
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 404 if self.path.endswith('/missing') else 200
+        body = '{{"path": "{}"}}'.format(self.path).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{}/api'.format(httpd.server_port)
+    httpd.shutdown()
+
+
+@pytest.fixture
+def app(server):
+    app = AsyncApp(server, max_requests=4)
+    yield app
+    app.close()
+
+
+class TestAsyncApp:
+    def test_request(self, app):
+        resp = app.request(webtest.TestRequest.blank('/users?page=2'))
+        assert resp.status_int == 200
+        assert resp.json == {'path': '/api/users?page=2'}
+
+    def test_unexpected_status(self, app):
+        with pytest.raises(webtest.AppError):
+            app.request(webtest.TestRequest.blank('/missing'))
+        resp = app.request(webtest.TestRequest.blank('/missing'),
+                           expect_errors=True)
+        assert resp.status_int == 404
+
+    def test_areq_gather(self, app):
+        RequestClass = make_request_class(app)
+        reqs = [RequestClass.blank('/users/{}'.format(i)) for i in range(5)]
+        resps = app.gather(*(req.areq(validate=False) for req in reqs))
+        assert [resp.json['path'] for resp in resps] == [
+            '/api/users/{}'.format(i) for i in range(5)]
+
+    def test_closed_at_session_end(self, server):
+        from ra import aio
+        from ra.plugins.pytest_ import pytest_unconfigure
+        app = AsyncApp(server)
+        app.request(webtest.TestRequest.blank('/users'))
+        assert app in aio._open
+        pytest_unconfigure(None)
+        assert app not in aio._open
+        assert app._session is None
+        assert not app._thread.is_alive()
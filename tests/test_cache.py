@@ -0,0 +1,77 @@
+import pytest
+import ramlfications
+from ra import cache, raml
+
+
+ROOT_RAML = """#%RAML 0.8
+---
+title: Cached API
+baseUri: http://example.com/api
+/users:
+  post:
+    body:
+      application/json:
+        example: !include user.json
+    responses:
+      201:
+        body:
+          application/json:
+            schema: |
+              {"type": "object", "required": ["username"]}
+"""
+
+
+@pytest.fixture
+def raml_path(tmpdir):
+    tmpdir.join('user.json').write('{"username": "earl"}')
+    path = tmpdir.join('api.raml')
+    path.write(ROOT_RAML)
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return str(tmpdir.join('cache'))
+
+
+def test_raml_files_follows_includes(raml_path):
+    files = cache.raml_files(raml_path)
+    assert [f.rsplit('/', 1)[-1] for f in files] == ['api.raml', 'user.json']
+
+
+def test_warm_parse_loads_from_cache(mocker, raml_path, cache_dir):
+    cold = raml.parse(raml_path, cache_dir=cache_dir)
+    spy = mocker.spy(ramlfications, 'parse')
+    warm = raml.parse(raml_path, cache_dir=cache_dir)
+    assert spy.call_count == 0
+    assert isinstance(warm, raml.RootNode)
+    node = warm.resources['/users']['POST']
+    assert isinstance(node, raml.ResourceNode)
+    assert node.body['application/json'].example == {'username': 'earl'}
+    validator = node.responses[201].validators['application/json']
+    assert not validator.is_valid({})
+    assert list(warm.resources) == list(cold.resources)
+    assert warm.resource_names.names == {'/users': 'user'}
+
+
+def test_editing_include_invalidates(mocker, tmpdir, raml_path, cache_dir):
+    raml.parse(raml_path, cache_dir=cache_dir)
+    tmpdir.join('user.json').write('{"username": "joe"}')
+    spy = mocker.spy(ramlfications, 'parse')
+    root = raml.parse(raml_path, cache_dir=cache_dir)
+    assert spy.call_count == 1
+    node = root.resources['/users']['POST']
+    assert node.body['application/json'].example == {'username': 'joe'}
+
+
+def test_compact_nodes_cached_separately(mocker, raml_path, cache_dir):
+    raml.parse(raml_path, cache_dir=cache_dir)
+    spy = mocker.spy(ramlfications, 'parse')
+    compact = raml.parse(raml_path, cache_dir=cache_dir, compact=True)
+    assert isinstance(compact, raml.CompactRoot)
+    assert spy.call_count == 1
+    warm = raml.parse(raml_path, cache_dir=cache_dir, compact=True)
+    assert spy.call_count == 1
+    assert isinstance(warm, raml.CompactRoot)
+    validator = warm.resources['/users']['POST'].responses[201].validators
+    assert not validator['application/json'].is_valid({})
@@ -0,0 +1,118 @@
+import pytest
+from six.moves.urllib.parse import parse_qs
+from ra.cases import CaseFailure, shrink_value
+from ra.dsl import APISuite
+
+
+def over(name, limit):
+    "Fail requests whose body or query has a :name: over :limit:."
+    def fail(method, data, query):
+        value = (data or {}).get(name, query.get(name, ['0'])[0])
+        return int(value) > limit
+    return fail
+
+
+@pytest.fixture
+def declare(test_raml, declare_tests, users_app):
+    """Declare a test for :verb: sending its request, and return the test
+    function and its builder."""
+    def _declare(verb, calls=None, fail=None, **req_params):
+        api = APISuite(test_raml('factory'),
+                       app=users_app(calls=calls, fail=fail))
+        builder, = declare_tests(api, verb,
+                                 test_fn=lambda req: req(validate=False),
+                                 **req_params)
+        return builder.scope.members[verb], builder
+    return _declare
+
+
+def test_runs_all_cases_in_one_call(declare):
+    calls = []
+    test, builder = declare('post', calls=calls, cases=50, seed=1)
+    req = builder.build()
+    test(req=req)
+    assert len(calls) == 50
+    assert len(req.timings) == 50
+    assert req.case.index == 49
+    assert set(['username', 'role']) <= set(req.data)
+
+
+def test_failure_shrunk_to_minimal_body(declare):
+    test, builder = declare('post', fail=over('age', 60), cases=200,
+                            seed=3)
+    req = builder.build()
+    with pytest.raises(CaseFailure) as excinfo:
+        test(req=req)
+    data = req.case.data
+    assert sorted(data) == ['age', 'role', 'username']
+    assert data['age'] == 61
+    assert len(data['username']) == 3
+    message = str(excinfo.value)
+    assert message.startswith('POST /users failed on case')
+    assert '(seed 3)' in message
+    assert '"age": 61' in message
+    assert 'AppError' in message
+
+
+def test_failure_shrunk_to_minimal_query(declare):
+    test, builder = declare('get', fail=over('limit', 40), cases=200,
+                            seed=5)
+    req = builder.build()
+    with pytest.raises(CaseFailure):
+        test(req=req)
+    assert req.case.query == {'limit': 41, 'role': req.case.query['role']}
+    assert req.query_string.startswith('limit=41&')
+
+
+def test_seed_reproduces_failure(declare):
+    messages = []
+    for _ in range(2):
+        test, builder = declare('post', fail=over('age', 60), cases=200,
+                                seed=11)
+        with pytest.raises(CaseFailure) as excinfo:
+            test(req=builder.build())
+        messages.append(str(excinfo.value))
+    assert messages[0] == messages[1]
+
+
+def test_declared_query_params_kept(declare):
+    test, builder = declare('get', cases=5, seed=1,
+                            query_params={'role': 'admin'})
+    req = builder.build()
+    test(req=req)
+    assert parse_qs(req.query_string)['role'] == ['admin']
+
+
+def test_needs_something_to_generate(declare):
+    with pytest.raises(ValueError):
+        declare('post', cases=5, body=b'{}')
+
+
+def test_example_body_not_repeated(test_raml, users_app, declare_tests):
+    api = APISuite(test_raml('validation'), app=users_app())
+    with pytest.raises(ValueError):
+        declare_tests(api, 'post', cases=5)
+
+
+def test_example_body_kept_with_generated_query(test_raml, users_app,
+                                                declare_tests):
+    calls = []
+    api = APISuite(test_raml('validation'), app=users_app(calls=calls))
+    api.query_factories.make_factory('POST /users', {
+        'type': 'object', 'required': ['page'],
+        'properties': {'page': {'type': 'integer', 'minimum': 1}}})
+    with pytest.warns(UserWarning, match='example body'):
+        builder, = declare_tests(api, 'post', cases=5, seed=1,
+                                 test_fn=lambda req: req(validate=False))
+    builder.scope.members['post'](req=builder.build())
+    assert [data for _, data, _ in calls] == [{'username': 'earl'}] * 5
+    assert all('page' in query for _, _, query in calls)
+
+
+def test_shrink_value():
+    assert list(shrink_value({'a': 3})) == [{}, {'a': 0}, {'a': 1},
+                                            {'a': 2}]
+    assert list(shrink_value(['ab', True]))[:3] == [[], [True], ['ab']]
+    assert list(shrink_value('abcd')) == ['', 'ab', 'abc']
+    assert list(shrink_value(-2.5)) == [0, -1, -2.0]
+    assert list(shrink_value(0)) == []
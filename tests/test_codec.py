@@ -0,0 +1,75 @@
+import datetime
+import pytest
+import simplejson as json
+from ra import codec
+from ra.dsl import APISuite
+
+
+class DateEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime.date):
+            return obj.isoformat()
+        return super(DateEncoder, self).default(obj)
+
+
+def test_default_codec():
+    selected = codec.get_codec()
+    assert isinstance(selected, codec.SimpleJSONCodec)
+    assert selected.dumps({'a': 1}) == b'{"a": 1}'
+    assert selected.loads(b'{"a": 1}') == {'a': 1}
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        codec.get_codec('yaml')
+
+
+def test_auto_falls_back_to_simplejson(mocker):
+    mocker.patch.object(codec, 'FAST_CODECS', ('nope',))
+    mocker.patch.dict(codec.CODECS, {'nope': mocker.Mock(
+        side_effect=ImportError)})
+    assert isinstance(codec.get_codec('auto'), codec.SimpleJSONCodec)
+
+
+def test_orjson_encodes_to_bytes():
+    pytest.importorskip('orjson')
+    selected = codec.get_codec('orjson')
+    assert selected.dumps({'a': [1, 2]}) == b'{"a":[1,2]}'
+    assert selected.loads(b'{"a":[1,2]}') == {'a': [1, 2]}
+
+
+def test_custom_encoder_falls_back():
+    pytest.importorskip('orjson')
+    selected = codec.get_codec('orjson', DateEncoder)
+    assert isinstance(selected, codec.EncoderFallbackCodec)
+    assert selected.dumps({'day': datetime.date(2016, 5, 16)}) == \
+        b'{"day": "2016-05-16"}'
+    assert selected.loads(b'{"a": 1}') == {'a': 1}
+
+
+def test_suite_uses_codec(mocker, test_raml, users_app, declare_tests):
+    pytest.importorskip('orjson')
+    api = APISuite(test_raml('validation'), app=users_app(),
+                   json_codec='orjson')
+    assert api.json_codec.name == 'orjson'
+
+    post, = declare_tests(api, 'post')
+    req = post.build()
+    assert req.body == b'{"username":"earl"}'
+    loads = mocker.spy(api.json_codec, 'loads')
+    resp = req()
+    assert resp.json == {'username': 'earl'}
+    assert loads.called
+
+
+def test_request_encoder_overrides_codec(test_raml, users_app,
+                                         declare_tests):
+    pytest.importorskip('orjson')
+    api = APISuite(test_raml('validation'), app=users_app(),
+                   json_codec='orjson')
+    post, = declare_tests(api, 'post')
+    req = post.build()
+    req.data = {'day': datetime.date(2016, 5, 16)}
+    req.JSONEncoder = DateEncoder
+    req.encode_data()
+    assert req.body == b'{"day": "2016-05-16"}'
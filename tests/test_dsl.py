@@ -14,3 +14,90 @@ class TestAutotest:
         resource_scope = api.resource_scopes[0]
         assert resource_scope.scope_fn == scope
 
+    def test_missing_uri_parameter_skipped(self, test_raml):
+        api = APISuite(test_raml('simple'), app=None)
+        Autotest(api).generate()
+        scopes = dict((scope.path, scope) for scope in api.resource_scopes)
+        with pytest.warns(UserWarning, match='Skipping autotests'):
+            scopes['/users/{username}'].scope_fn(scopes['/users/{username}'])
+        assert not scopes['/users/{username}'].members
+        scopes['/users'].scope_fn(scopes['/users'])
+        assert scopes['/users'].members
+
+
+    @pytest.mark.parametrize("method,waits", [
+        ('POST', True), ('PUT', True), ('DELETE', True), ('GET', False),
+    ])
+    def test_wait_only_on_write_methods(self, mocker, test_raml, method,
+                                        waits):
+        api = APISuite(test_raml('simple'), app=None)
+        ready = mocker.Mock()
+        autotest = Autotest(api, settings={'ready': ready})
+        req = mocker.Mock(method=method)
+        autotest.wait(req, 'resp')
+        assert ready.called == waits
+
+
+class TestRequestBuilder:
+    def test_request_built_lazily(self, mocker, test_raml):
+        from ra import marks
+        api = APISuite(test_raml('simple'), app=None)
+        factory = mocker.Mock(return_value={'username': 'joe'})
+
+        @api.resource('/users')
+        def users_resource(users):
+            pass
+
+        scope = api.resource_scopes[0]
+
+        @scope.post(factory=factory)
+        def post(req):
+            pass
+
+        assert not factory.called
+        builder = marks.get(post, 'req_builder')
+        req = builder.build()
+        assert factory.call_count == 1
+        assert req.method == 'POST'
+        assert req.json_body == {'username': 'joe'}
+        assert builder.build() is req
+
+        builder.release()
+        assert builder.build() is not req
+        assert factory.call_count == 2
+
+
+class TestTestSuite:
+    @pytest.fixture
+    def suite(self, mocker):
+        from ra.dsl import TestSuite
+        suite = TestSuite()
+        suite.add_test('test_get', mocker.Mock(method='get', path='/users'))
+        return suite
+
+    def test_test_exists(self, suite):
+        assert suite.test_exists('GET', '/users')
+        assert suite.test_exists('get', '/users')
+        assert not suite.test_exists('POST', '/users')
+        assert not suite.test_exists('GET', '/items')
+
+    def test_uncovered(self, suite):
+        resources = {'/users': ['GET', 'POST'], '/items': ['GET']}
+        assert sorted(suite.uncovered(resources)) == [
+            ('/items', 'GET'), ('/users', 'POST')]
+
+    def test_undeclared_method(self, test_raml):
+        api = APISuite(test_raml('simple'), app=None)
+
+        @api.resource('/users')
+        def users_resource(users):
+            pass
+
+        scope = api.resource_scopes[0]
+        with pytest.warns(UserWarning, match='undeclared method'):
+            @scope.method('trace', data={})
+            def trace(req):
+                pass
+
+        assert api.test_suite.tests == [(trace, None)]
+        assert not api.test_suite.test_exists('TRACE', '/users')
@@ -28,3 +28,153 @@ class TestExamples:
         obj = examples.build('test', c=4)
         assert obj['a'] == 1
         assert obj['c'] == 4
+
+
+USER_SCHEMA = {
+    '$schema': 'http://json-schema.org/draft-04/schema',
+    'type': 'object',
+    'properties': {
+        'username': {'type': 'string', 'pattern': '^[a-z][a-z0-9_]{2,15}$'},
+        'age': {'type': 'integer', 'minimum': 18, 'maximum': 99},
+        'score': {'type': 'number', 'minimum': 0, 'maximum': 1,
+                  'exclusiveMaximum': True},
+        'role': {'enum': ['admin', 'member']},
+        'email': {'type': 'string', 'format': 'email'},
+        'nickname': {'type': 'string', 'minLength': 2, 'maxLength': 4},
+        'tags': {'type': 'array', 'items': {'type': 'string'},
+                 'uniqueItems': True, 'maxItems': 3},
+        'address': {'$ref': '#/definitions/address'},
+        'rank': {'type': ['integer', 'null'], 'multipleOf': 5},
+    },
+    'required': ['username', 'age', 'role'],
+    'definitions': {
+        'address': {
+            'type': 'object',
+            'properties': {'zip': {'type': 'string',
+                                   'pattern': r'\d{5}(-\d{4})?'}},
+            'required': ['zip'],
+        },
+    },
+}
+
+
+class TestSchemaFactory:
+    def test_bulk_values_are_valid(self):
+        import jsonschema
+        validator = jsonschema.Draft4Validator(USER_SCHEMA)
+        values = factory.SchemaFactory(USER_SCHEMA, seed=1).build_many(2000)
+        assert len(values) == 2000
+        for value in values:
+            validator.validate(value)
+        assert set(v['role'] for v in values) == set(['admin', 'member'])
+        assert any('address' in v for v in values)
+        assert any('address' not in v for v in values)
+
+    def test_seeded(self):
+        first = factory.SchemaFactory(USER_SCHEMA, seed=42)
+        second = factory.SchemaFactory(USER_SCHEMA, seed=42)
+        assert first.build_many(10) == second.build_many(10)
+        assert first() == second()
+
+    def test_params_override(self):
+        user = factory.SchemaFactory(USER_SCHEMA, seed=1)(username='earl')
+        assert user['username'] == 'earl'
+
+    def test_params_need_object_schema(self):
+        names = factory.SchemaFactory({'type': 'array',
+                                       'items': {'type': 'string'}})
+        with pytest.raises(TypeError):
+            names(username='earl')
+        assert isinstance(names(), list)
+
+    @pytest.mark.parametrize('pattern', [
+        r'^[A-Z]{3}-\d+$', r'(foo|bar)+baz', r'[^abc]{2}\w\s\.', r'x*?y+?',
+    ])
+    def test_pattern(self, pattern):
+        import random
+        import re
+        generate = factory.compile_pattern(pattern)
+        rand = random.Random(0)
+        for _ in range(100):
+            assert re.search(pattern, generate(rand))
+
+    def test_unsupported(self):
+        with pytest.raises(ValueError):
+            factory.compile_pattern(r'(a)\1')
+        with pytest.raises(ValueError):
+            factory.SchemaFactory({'type': 'integer', 'minimum': 5,
+                                   'maximum': 1})
+
+    def test_named_params(self, test_raml):
+        root = test_raml('factory', parsed=True)
+        params = root.resources['/users']['GET'].query_params
+        schema = factory.named_params_schema(params)
+        assert schema['required'] == ['role']
+        assert schema['properties']['limit'] == {
+            'type': 'integer', 'minimum': 1, 'maximum': 50}
+        for query in factory.SchemaFactory(schema, seed=1).build_many(200):
+            assert query['role'] in ('admin', 'member')
+            assert 1 <= query.get('limit', 1) <= 50
+
+
+class TestSchemaFactories:
+    def test_default_seed(self):
+        first, second = factory.SchemaFactories(), factory.SchemaFactories()
+        for factories in (first, second):
+            factories.make_factory('user', USER_SCHEMA)
+        assert first.build_many('user', 5) == second.build_many('user', 5)
+
+    def test_unsupported_schema(self):
+        factories = factory.SchemaFactories()
+        factories.make_factory('thing', {'type': 'any'})
+        with pytest.warns(UserWarning):
+            assert factories.get_factory('thing') is None
+        with pytest.raises(ValueError):
+            factories.build('thing')
+        with pytest.raises(KeyError):
+            factories.build('other')
+
+
+class TestSuiteSchemaFactories:
+    @pytest.fixture
+    def api(self, test_raml):
+        from ra.dsl import APISuite
+        return APISuite(test_raml('factory'), app=lambda e, s: [],
+                        factory_seed=7)
+
+    def test_registered(self, api):
+        assert api.examples.build('POST /users') == {}
+        user_factory = api.schema_factories.get_factory('POST /users')
+        assert api.schema_factories.get_factory('user') is not None
+        assert set(['username', 'role']) <= set(user_factory())
+        queries = api.query_factories.build_many('GET /users', 5)
+        assert all('role' in query for query in queries)
+
+    def test_seeded_by_suite(self, api, test_raml):
+        from ra.dsl import APISuite
+        other = APISuite(test_raml('factory'), app=lambda e, s: [],
+                         factory_seed=7)
+        assert (api.schema_factories.build_many('user', 5) ==
+                other.schema_factories.build_many('user', 5))
+
+    def test_examples_used_by_default(self, api, declare_tests):
+        builder, = declare_tests(api, 'post')
+        assert builder.factory is api.examples.get_factory('POST /users')
+
+    def test_opt_in(self, test_raml, declare_tests):
+        from ra.dsl import APISuite
+        api = APISuite(test_raml('factory'), app=lambda e, s: [],
+                       generate_bodies=True)
+        builder, = declare_tests(api, 'post')
+        assert builder.factory is api.schema_factories.get_factory(
+            'POST /users')
+
+    def test_opt_in_falls_back_to_example(self, test_raml, declare_tests):
+        from ra.dsl import APISuite
+        api = APISuite(test_raml('factory'), app=lambda e, s: [],
+                       generate_bodies=True)
+        for name in ('POST /users', 'user'):
+            api.schema_factories.make_factory(name, {'type': 'any'})
+        with pytest.warns(UserWarning):
+            builder, = declare_tests(api, 'post')
+        assert builder.factory is api.examples.get_factory('POST /users')
@@ -0,0 +1,186 @@
+import pytest
+import simplejson as json
+from ra.dsl import APISuite
+from ra.isolation import Isolation
+from ra.plugins.pytest_ import isolated_builder
+
+sa = pytest.importorskip('sqlalchemy')
+from sqlalchemy import orm, pool
+from ra.isolation import SQLAlchemyIsolation
+
+
+metadata = sa.MetaData()
+users_table = sa.Table('users', metadata,
+                       sa.Column('username', sa.String, primary_key=True))
+
+
+def make_engine():
+    engine = sa.create_engine('sqlite://', poolclass=pool.StaticPool)
+
+    # let SQLAlchemy manage transactions so pysqlite supports savepoints
+    @sa.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @sa.event.listens_for(engine, 'begin')
+    def begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+    metadata.create_all(engine)
+    return engine
+
+
+def make_app(Session):
+    def app(environ, start_response):
+        session = Session()
+        try:
+            if environ['REQUEST_METHOD'] == 'POST':
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+                data = json.loads(environ['wsgi.input'].read(length))
+                session.execute(users_table.insert().values(**data))
+                session.commit()
+                status, body = '201 Created', data
+            else:
+                rows = session.execute(users_table.select()).fetchall()
+                status, body = '200 OK', [{'username': row.username}
+                                          for row in rows]
+        finally:
+            Session.remove()
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('X-Total-Count', str(len(body)))])
+        return [json.dumps(body).encode('utf-8')]
+    return app
+
+
+@pytest.fixture
+def engine():
+    engine = make_engine()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def api(test_raml, engine):
+    Session = orm.scoped_session(orm.sessionmaker())
+
+    def bind(connection):
+        Session.configure(bind=connection,
+                          join_transaction_mode='create_savepoint')
+
+    isolation = SQLAlchemyIsolation(engine, bind=bind)
+    api = APISuite(test_raml('validation'), app=make_app(Session),
+                   isolation=isolation)
+    yield api
+    isolation.close()
+
+
+def run_isolated(api, builder):
+    builder.release()
+    api.begin_test(builder)
+    try:
+        return builder.build()()
+    finally:
+        api.rollback_test(builder)
+
+
+def test_rolled_back_between_tests(api, engine, declare_tests):
+    post, get = declare_tests(api, 'post', 'get')
+    assert run_isolated(api, post).json == {'username': 'earl'}
+    # the same insert again would violate the primary key if committed
+    assert run_isolated(api, post).status_int == 201
+    assert run_isolated(api, get).json == []
+
+    api.begin_test(get)
+    post.release()
+    post.build()()
+    assert get.build()().json == [{'username': 'earl'}]
+    api.rollback_test(get)
+
+    api.isolation.close()
+    with engine.connect() as connection:
+        count = connection.execute(
+            sa.select(sa.func.count()).select_from(users_table)).scalar()
+    assert count == 0
+
+
+def test_plugin_isolates_suite_tests(api, declare_tests):
+    post, = declare_tests(api, 'post')
+    assert isolated_builder(post.scope.members['post']) is post
+    assert isolated_builder(lambda: None) is None
+    assert isolated_builder(None) is None
+
+
+def test_plugin_skips_suites_without_isolation(test_raml, declare_tests):
+    api = APISuite(test_raml('validation'), app=make_app(None))
+    post, = declare_tests(api, 'post')
+    assert isolated_builder(post.scope.members['post']) is None
+
+
+def test_plugin_skips_concurrent_autotests(api, declare_tests):
+    from ra import marks
+    post, = declare_tests(api, 'post')
+    fn = post.scope.members['post']
+    marks.set(fn, 'runner', object())
+    assert isolated_builder(fn) is None
+
+
+ISOLATED_TESTS = """
+import pytest
+from ra.dsl import APISuite
+from ra.isolation import Isolation
+
+events = []
+
+
+class RecordingIsolation(Isolation):
+    def begin(self, builder=None):
+        events.append('begin')
+
+    def rollback(self, builder=None):
+        events.append('rollback')
+
+
+api = APISuite({raml!r}, app=lambda environ, start_response: [],
+               isolation=RecordingIsolation())
+
+
+@api.resource('/users')
+def users(users):
+    pass
+
+scope = api.resource_scopes[0]
+del users
+
+
+@pytest.fixture(scope='module')
+def user():
+    events.append('user')
+
+
+@pytest.fixture
+def token():
+    events.append('token')
+
+
+def first(user, token):
+    assert events == ['user', 'begin', 'token']
+
+
+def second(user, token):
+    assert events == ['user', 'begin', 'token', 'rollback', 'begin',
+                      'token']
+
+
+test_first = scope.method('get', first)
+test_second = scope.method('post', second)
+"""
+
+
+def test_wider_scoped_fixtures_not_rolled_back(test_raml, tmpdir):
+    tmpdir.join('pytest.ini').write('[pytest]\n')
+    path = tmpdir.join('test_isolated.py')
+    path.write(ISOLATED_TESTS.format(raml=test_raml('validation')))
+    code = pytest.main([str(path), '-q', '-p', 'ra.plugins.pytest_',
+                        '-p', 'no:cacheprovider', '-c',
+                        str(tmpdir.join('pytest.ini'))])
+    assert code == 0
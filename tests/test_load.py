@@ -0,0 +1,52 @@
+import pytest
+from ra.dsl import APISuite
+from ra.load import LoadRunner, parse_weights
+
+
+@pytest.fixture
+def users_builders(test_raml, declare_tests, users_app):
+    def _users_builders(**app_params):
+        api = APISuite(test_raml('validation'), app=users_app(**app_params))
+        return declare_tests(api, 'get', 'post')
+    return _users_builders
+
+
+def test_parse_weights():
+    assert parse_weights(['GET /users=3', 'DELETE=0']) == [
+        ('GET /users', 3.0), ('DELETE', 0.0)]
+    with pytest.raises(ValueError):
+        parse_weights(['GET /users'])
+
+
+def test_runs_requested_number_of_requests(users_builders):
+    runner = LoadRunner(users_builders(), workers=3,
+                        requests=40, validate=True, seed=1)
+    rows = runner.run()
+    assert sum(row['count'] for row in rows) == 40
+    assert set(row['endpoint'] for row in rows) == set(['GET /users',
+                                                         'POST /users'])
+    for row in rows:
+        assert row['errors'] == 0
+        assert row['p50'] <= row['p95'] <= row['p99'] <= row['max']
+        assert row['throughput'] > 0
+
+
+def test_weights(users_builders):
+    runner = LoadRunner(users_builders(), workers=1,
+                        requests=20, weights=[('POST', 0)])
+    rows = runner.run()
+    assert [(row['endpoint'], row['count']) for row in rows] == [
+        ('GET /users', 20)]
+
+
+def test_errors_counted(users_builders):
+    runner = LoadRunner(users_builders(status='500 Oops'), workers=2,
+                        requests=10)
+    rows = runner.run()
+    assert sum(row['errors'] for row in rows) == 10
+    assert all(row['error_rate'] == 1.0 for row in rows)
+
+
+def test_needs_duration_or_requests(users_builders):
+    with pytest.raises(ValueError):
+        LoadRunner(users_builders())
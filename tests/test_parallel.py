@@ -0,0 +1,118 @@
+import threading
+import pytest
+from ra import parallel
+
+
+def test_dependency_order():
+    tasks = [
+        ('/users/{username}', 'DELETE'),
+        ('/users/{username}/profile', 'GET'),
+        ('/users/{username}', 'GET'),
+        ('/users/{username}/profile', 'DELETE'),
+        ('/users', 'GET'),
+        ('/users', 'POST'),
+    ]
+    assert parallel.dependency_order(tasks) == [
+        ('/users', 'POST'),
+        ('/users', 'GET'),
+        ('/users/{username}', 'GET'),
+        ('/users/{username}/profile', 'GET'),
+        ('/users/{username}/profile', 'DELETE'),
+        ('/users/{username}', 'DELETE'),
+    ]
+
+
+class TestConcurrentRunner:
+    def make_runner(self, run, workers=2):
+        runner = parallel.ConcurrentRunner(workers)
+        reqs = {}
+        for path, method in [('/users', 'POST'), ('/users/{id}', 'DELETE'),
+                             ('/users/{id}', 'GET'), ('/items', 'GET')]:
+            req = reqs[method + ' ' + path] = object()
+            runner.add(path, method, req, run)
+        return runner, reqs
+
+    def test_runs_subtrees_in_order(self):
+        ran = []
+        lock = threading.Lock()
+
+        def run(req):
+            with lock:
+                ran.append(req)
+        runner, reqs = self.make_runner(run)
+        names = {id(req): name for name, req in reqs.items()}
+        for req in reqs.values():
+            runner.result(req)
+        users = [names[id(req)] for req in ran if '/users' in names[id(req)]]
+        assert users == ['POST /users', 'GET /users/{id}',
+                         'DELETE /users/{id}']
+        assert len(ran) == 4
+
+    def test_failure_reraised_for_its_request(self):
+        def run(req):
+            if req is reqs['GET /items']:
+                raise AssertionError('boom')
+        runner, reqs = self.make_runner(run)
+        runner.result(reqs['POST /users'])
+        with pytest.raises(AssertionError):
+            runner.result(reqs['GET /items'])
+
+    def test_only_selected_requests_run(self):
+        ran = []
+        runner, reqs = self.make_runner(ran.append)
+        runner.select(reqs['GET /items'])
+        runner.result(reqs['GET /items'])
+        assert ran == [reqs['GET /items']]
+
+    def test_lazy_runs_only_the_waited_for_subtree(self):
+        ran = []
+        runner, reqs = self.make_runner(ran.append)
+        runner.distribute(grouped=True)
+        runner.result(reqs['GET /users/{id}'])
+        runner.result(reqs['DELETE /users/{id}'])
+        assert reqs['GET /items'] not in ran
+        assert ran[0] is reqs['POST /users']
+        runner.result(reqs['GET /items'])
+        assert len(ran) == 4
+
+    def test_inline_runs_only_the_waited_for_request(self):
+        ran = []
+        runner, reqs = self.make_runner(ran.append)
+        runner.distribute(grouped=False)
+        runner.result(reqs['GET /users/{id}'])
+        assert ran == [reqs['GET /users/{id}']]
+
+    def test_closed_at_session_end(self):
+        ran = []
+        runner, reqs = self.make_runner(ran.append)
+        runner.result(reqs['GET /items'])
+        pool = runner._pool
+        parallel.close_all()
+        assert runner._pool is None
+        assert runner not in parallel._open
+        assert all(not worker.is_alive() for worker in pool._pool)
+        assert len(ran) == 4
+
+
+def test_workers_distribute_runners(mocker):
+    from ra import marks
+    from ra.plugins.pytest_ import pytest_collection_finish
+
+    runner = parallel.ConcurrentRunner(2)
+    items = []
+    for name in ('post', 'get'):
+        def test(req):
+            pass
+        marks.mark(test, req_builder=object(), runner=runner)
+        runner.add('/users', name.upper(), marks.get(test, 'req_builder'),
+                   lambda req: None)
+        items.append(mocker.Mock(obj=test))
+    options = {'ra_dist': True}
+    config = mocker.Mock(workerinput={}, getoption=options.get)
+    pytest_collection_finish(mocker.Mock(config=config, items=items))
+    assert len(runner.selected) == 2
+    assert runner.lazy and not runner.inline
+
+    options['ra_dist'] = False
+    pytest_collection_finish(mocker.Mock(config=config, items=items))
+    assert runner.inline and not runner.lazy
@@ -0,0 +1,123 @@
+import collections
+import pytest
+from ra.plugins.pytest_ import scope_unit
+
+
+@pytest.mark.parametrize("nodeid,unit", [
+    ('tests/test_api.py::/users::get', 'tests/test_api.py::/users'),
+    ('tests/test_api.py::/users::/users/{username}::get',
+     'tests/test_api.py::/users'),
+    ('tests/test_api.py::/users/{username}::delete',
+     'tests/test_api.py::/users'),
+    ('tests/test_api.py::autotests::/items/{id}::get',
+     'tests/test_api.py::autotests::/items'),
+    ('tests/test_api.py::test_something', 'tests/test_api.py'),
+    ('tests/test_api.py::TestThing::test_it', 'tests/test_api.py::TestThing'),
+])
+def test_scope_unit(nodeid, unit):
+    assert scope_unit(nodeid) == unit
+
+
+def test_resource_scope_scheduling_orders_by_duration(mocker):
+    pytest.importorskip('xdist')
+    from ra.plugins.xdist_ import ResourceScopeScheduling
+
+    config = mocker.Mock()
+    config.getvalue.return_value = ['2*popen']
+    config.cache.get.return_value = {'f.py::/slow': 10.0, 'f.py::/fast': 1.0}
+    sched = ResourceScopeScheduling(config)
+    sched.workqueue = collections.OrderedDict([
+        ('f.py::/fast', {'f.py::/fast::get': False}),
+        ('f.py::/new', {'f.py::/new::get': False, 'f.py::/new::post': False,
+                        'f.py::/new::put': False}),
+        ('f.py::/slow', {'f.py::/slow::get': False}),
+    ])
+    sched._order_workqueue()
+    assert list(sched.workqueue) == ['f.py::/new', 'f.py::/slow',
+                                     'f.py::/fast']
+
+
+@pytest.mark.parametrize("ra_dist,dist,records", [
+    (True, 'load', True),
+    (True, 'no', False),
+    (False, 'load', False),
+])
+def test_scope_durations_recorded_when_scheduling(mocker, ra_dist, dist,
+                                                  records):
+    from ra.plugins.pytest_ import pytest_configure
+    options = {'ra_dist': ra_dist, 'dist': dist, 'ra_no_raml_cache': True}
+    config = mocker.Mock(spec=['getoption', 'pluginmanager', 'cache'])
+    config.getoption.side_effect = lambda name, default=None: options.get(
+        name, default)
+    pytest_configure(config)
+    names = [call[0][1] for call in
+             config.pluginmanager.register.call_args_list]
+    assert ('ra_scope_durations' in names) == records
+
+
+class TestScopeLocals:
+    @pytest.fixture
+    def api(self, test_raml):
+        from ra.dsl import APISuite
+        return APISuite(test_raml('simple'), app=None)
+
+    def collect(self, fn):
+        from ra.plugins import pytest_
+        return pytest_.make_module_from_function(fn)
+
+    def test_registered_members_collected(self, api):
+        @api.resource('/users')
+        def users_resource(users):
+            @users.fixture
+            def a_fixture():
+                return 1
+
+            @users.get(data={})
+            def get(req):
+                pass
+
+            @users.resource('/{username}')
+            def user_resource(user):
+                pass
+
+        module = self.collect(users_resource)
+        assert set(['a_fixture', 'get', 'user_resource']) <= \
+            set(vars(module))
+
+    def test_only_registered_names_collected(self, api):
+        calls = []
+        slow = pytest.mark.xfail
+
+        @api.resource('/users')
+        def users_resource(users):
+            calls.append(1)
+
+            @users.get(data={})
+            def get(req):
+                pass
+
+            users.register(slow, 'pytestmark')
+            helper = 1
+
+        module = self.collect(users_resource)
+        assert calls == [1]
+        assert len(api.test_suite.tests) == 1
+        assert 'get' in vars(module)
+        assert vars(module)['pytestmark'] is slow
+        assert 'helper' not in vars(module)
+
+    def test_warns_about_unregistered_functions(self, api):
+        @api.resource('/users')
+        def users_resource(users):
+            @users.get(data={})
+            def get(req):
+                pass
+
+            @pytest.fixture
+            def plain_fixture():
+                return 1
+
+        with pytest.warns(UserWarning, match='plain_fixture') as record:
+            module = self.collect(users_resource)
+        assert 'get' not in str(record[0].message)
+        assert 'plain_fixture' not in vars(module)
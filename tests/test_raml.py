@@ -0,0 +1,141 @@
+import pytest
+from ra import raml
+
+
+@pytest.mark.parametrize("path,name", [
+    ('/users', 'user'),
+    ('/users/{username}', 'user'),
+    ('/users/{username}/profile', 'user.profile'),
+    ('/users/{username}/settings', 'user.setting'),
+])
+def test_resource_name_from_path(path, name):
+    assert raml.resource_name_from_path(path) == name
+
+
+def test_resource_names_index(mocker):
+    import inflection
+    spy = mocker.spy(inflection, 'singularize')
+    names = raml.ResourceNames(['/items', '/items/{id}',
+                                '/items/{id}/parts'])
+    assert names.names == {'/items': 'item', '/items/{id}': 'item',
+                           '/items/{id}/parts': 'item.part'}
+    assert names.paths == {'item': ['/items', '/items/{id}'],
+                           'item.part': ['/items/{id}/parts']}
+    # each unique segment is singularized once
+    assert spy.call_count == 2
+    assert names.name('/items/{id}/things') == 'item.thing'
+    assert names.paths['item.thing'] == ['/items/{id}/things']
+
+
+def test_root_node_indexes_resource_names(test_raml):
+    root = test_raml('simple', parsed=True)
+    assert set(root.resource_names.names) == set(root.resources)
+
+
+class TestPathBuilder:
+    def test_build(self):
+        builder = raml.PathBuilder('/users/{username}/posts/{id}',
+                                   {'username': 'earl', 'id': None})
+        assert builder.segments == ['/users/', 'username', '/posts/', 'id',
+                                    '']
+        assert builder.required == ('id',)
+        assert builder.build({'id': 3}) == '/users/earl/posts/3'
+        assert builder.build({'id': 3, 'username': 'joe'}) == \
+            '/users/joe/posts/3'
+
+    def test_missing_params(self):
+        builder = raml.PathBuilder('/users/{username}/posts/{id}')
+        assert builder.missing({'id': 1}) == ['username']
+        with pytest.raises(raml.URIParameterError) as excinfo:
+            builder.build({'id': 1})
+        assert 'username of /users/{username}/posts/{id}' in \
+            str(excinfo.value)
+
+    def test_bind(self):
+        builder = raml.PathBuilder('/users/{username}').bind(
+            '/api', username='earl')
+        assert builder.template == '/api/users/{username}'
+        assert builder.build() == '/api/users/earl'
+
+    def test_compiled_on_parse(self, test_raml):
+        root = test_raml('simple', parsed=True)
+        builder = root.resources['/users/{username}']['GET'].path_builder
+        assert builder.params == ('username',)
+        assert builder.required == ('username',)
+        assert root.resources['/users']['GET'].path_builder.build() == \
+            '/users'
+
+
+def test_missing_uri_param_reported_when_declaring_tests(test_raml):
+    from ra.dsl import APISuite
+    api = APISuite(test_raml('simple'), app=None)
+
+    @api.resource('/users/{username}')
+    def user(user):
+        pass
+
+    scope = api.resource_scopes[0]
+    with pytest.raises(raml.URIParameterError):
+        @scope.get
+        def get(req):
+            pass
+
+    assert scope.resolve_path(username='earl') == '/1/users/earl'
+
+
+class TestCompactNodes:
+    @pytest.fixture
+    def compact(self, test_raml):
+        return raml.parse(test_raml('validation'), compact=True)
+
+    def test_same_resources(self, test_raml, compact):
+        full = test_raml('validation', parsed=True)
+        assert list(compact.resources) == list(full.resources)
+        for path, nodes in compact.resources.items():
+            assert list(nodes) == list(full.resources[path])
+        assert compact.base_uri == full.base_uri
+        node = compact.resources['/users']['POST']
+        assert node.body['application/json'].example == {'username': 'earl'}
+        assert not hasattr(node, '__dict__')
+
+    def test_responses_compiled(self, compact):
+        response = compact.resources['/users']['GET'].responses[200]
+        assert response.validators['application/json'].is_valid(
+            [{'username': 'earl'}])
+        assert [check.name for check in response.header_plan] == [
+            'X-Total-Count', 'X-Cursor']
+
+    def test_pickle(self, compact):
+        import pickle
+        loaded = pickle.loads(pickle.dumps(compact, pickle.HIGHEST_PROTOCOL))
+        response = loaded.resources['/users']['GET'].responses[200]
+        assert not response.validators['application/json'].is_valid([{}])
+        assert len(response.header_plan) == 2
+
+    def test_parents_linked(self, test_raml):
+        root = raml.parse(test_raml('simple'), compact=True)
+        node = root.resources['/users/{username}']['GET']
+        assert node.parent in root.resources['/users'].values()
+
+    def test_api_suite(self, test_raml):
+        from ra import marks
+        from ra.dsl import APISuite
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'application/json'),
+                                      ('X-Total-Count', '1')])
+            return [b'[{"username": "earl"}]']
+
+        api = APISuite(test_raml('validation'), app=app, compact_raml=True)
+        assert isinstance(api.raml, raml.CompactRoot)
+
+        @api.resource('/users')
+        def users(users):
+            pass
+
+        @api.resource_scopes[0].get
+        def get(req):
+            pass
+
+        req = marks.get(get, 'req_builder').build()
+        assert req().json == [{'username': 'earl'}]
@@ -0,0 +1,26 @@
+import pytest
+from ra import readiness
+
+
+def test_wait_until_polls_until_true():
+    calls = []
+
+    def condition():
+        calls.append(1)
+        return len(calls) == 3
+
+    readiness.wait_until(condition, timeout=1, delay=0.001)
+    assert len(calls) == 3
+
+
+def test_wait_until_times_out():
+    with pytest.raises(readiness.WaitTimeout):
+        readiness.wait_until(lambda: False, timeout=0.01, delay=0.001)
+
+
+def test_poll_passes_request_and_response():
+    seen = []
+    strategy = readiness.poll(lambda req, resp: seen.append((req, resp)) or
+                              True)
+    strategy('req', 'resp')
+    assert seen == [('req', 'resp')]
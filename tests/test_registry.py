@@ -0,0 +1,56 @@
+import os
+import shutil
+import pytest
+from ra import registry
+from ra.dsl import APISuite
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    registry.clear()
+    yield
+    registry.clear()
+
+
+def test_raml_shared_between_suites(test_raml):
+    first = APISuite(test_raml('simple'), app=None)
+    second = APISuite(test_raml('simple'), app=None)
+    assert first.raml is second.raml
+    isolated = APISuite(test_raml('simple'), app=None, shared=False)
+    assert isolated.raml is not first.raml
+
+
+def test_modified_raml_reparsed(tmpdir, test_raml):
+    path = str(tmpdir.join('simple.raml'))
+    shutil.copy(test_raml('simple'), path)
+    first = APISuite(path, app=None)
+    mtime = os.path.getmtime(path)
+    os.utime(path, (mtime + 10, mtime + 10))
+    second = APISuite(path, app=None)
+    assert first.raml is not second.raml
+
+
+def test_modified_include_reparsed(tmpdir, mocker):
+    root = tmpdir.join('api.raml')
+    root.write('#%RAML 0.8\nschemas:\n  - user: !include user.json\n')
+    schema = tmpdir.join('user.json')
+    schema.write('{}')
+    parse = mocker.Mock(side_effect=lambda path: object())
+    first = registry.get_raml(str(root), parse)
+    assert registry.get_raml(str(root), parse) is first
+    mtime = os.path.getmtime(str(schema))
+    os.utime(str(schema), (mtime + 10, mtime + 10))
+    assert registry.get_raml(str(root), parse) is not first
+    assert parse.call_count == 2
+
+
+def test_app_shared_by_url(test_raml):
+    pytest.importorskip('wsgiproxy')
+    first = APISuite(test_raml('simple'), app='http://localhost:6543')
+    second = APISuite(test_raml('simple'), app='http://localhost:6543')
+    assert first.app is second.app
+    other = APISuite(test_raml('simple'), app='http://localhost:6544')
+    assert other.app is not first.app
+    isolated = APISuite(test_raml('simple'), app='http://localhost:6543',
+                        shared=False)
+    assert isolated.app is not first.app
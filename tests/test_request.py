@@ -26,6 +26,17 @@ class TestRequest:
 
         (dict(only=['GET'], exclude=['/foo']), 'GET', '/foo', False),
         (dict(only=['GET'], exclude=['/foo']), 'GET', '/bar', True),
+
+        (dict(only=['GET /foo/*', 'POST /bar', '/baz']), 'GET', '/foo/1',
+         True),
+        (dict(only=['GET /foo/*', 'POST /bar', '/baz']), 'POST', '/foo/1',
+         False),
+        (dict(only=['GET /foo/*', 'POST /bar', '/baz']), 'POST', '/baz',
+         True),
+        (dict(only=['GET /foo/*', 'POST /bar', '/baz']), 'delete', '/baz',
+         True),
+        (dict(only=['get /foo']), 'GET', '/foo', True),
+        (dict(only=['/users/*']), 'GET', '/users', False),
     ])
     def test_match_request(self, conditions, method, path, expected):
         assert bool(_match_request(path, method, **conditions)) == expected
@@ -0,0 +1,122 @@
+import pytest
+import simplejson as json
+from ra import marks, timing
+from ra.dsl import APISuite
+from ra.plugins.pytest_ import RequestTimings
+
+
+@pytest.fixture
+def api(test_raml, users_app):
+    return APISuite(test_raml('validation'), app=users_app())
+
+
+class TestRequestTimings:
+    def test_phases_recorded(self, api, declare_tests):
+        req = declare_tests(api, 'get')[0].build()
+        resp = req()
+        assert set(resp.timings) == set(timing.PHASES)
+        assert all(value >= 0 for value in resp.timings.values())
+        assert req.timings == [resp.timings]
+        assert timing.endpoint(req) == 'GET /users'
+
+    def test_build_counted_once(self, api, declare_tests):
+        req = declare_tests(api, 'get')[0].build()
+        req()
+        resp = req(validate=False)
+        assert set(resp.timings) == set(['dispatch'])
+        assert len(req.timings) == 2
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert timing.percentile(values, 50) == 50
+    assert timing.percentile(values, 95) == 95
+    assert timing.percentile(values, 100) == 100
+    assert timing.percentile([7], 95) == 7
+    assert timing.percentile([], 50) is None
+
+
+def test_summarize_slowest_first():
+    rows = timing.summarize([
+        ('GET /a', {'dispatch': 0.1}),
+        ('GET /b', {'dispatch': 0.3, 'validate_body': 0.1}),
+        ('GET /a', {'dispatch': 0.3}),
+    ])
+    assert [row['endpoint'] for row in rows] == ['GET /b', 'GET /a']
+    assert rows[1]['count'] == 2
+    assert rows[1]['mean'] == pytest.approx(0.2)
+    assert rows[1]['max'] == pytest.approx(0.3)
+    assert rows[0]['p95'] == pytest.approx(0.4)
+
+
+def test_reporter_summary_and_export(mocker, tmpdir):
+    path = str(tmpdir.join('timings.jsonl'))
+    options = {'ra_slowest': 10, 'ra_timings_json': path}
+    config = mocker.Mock(getoption=options.get)
+    reporter = RequestTimings(config)
+    reporter.pytest_runtest_logreport(mocker.Mock(
+        nodeid='test_api.py::/users::get',
+        user_properties=[('ra_timings', [{'endpoint': 'GET /users',
+                                          'dispatch': 0.25}])]))
+
+    terminal = mocker.Mock()
+    reporter.pytest_terminal_summary(terminal)
+    lines = [call[0][0] for call in terminal.write_line.call_args_list]
+    assert lines[1].startswith('GET /users')
+    assert '250.0ms' in lines[1]
+
+    reporter.pytest_sessionfinish(None)
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{'nodeid': 'test_api.py::/users::get',
+                        'endpoint': 'GET /users', 'dispatch': 0.25,
+                        'total': 0.25}]
+
+
+class TestLatencyBudget:
+    def test_check(self):
+        budget = timing.LatencyBudget(50, percentile=50, runs=3)
+        budget.check([0.01, 0.04, 0.2])
+        with pytest.raises(timing.LatencyBudgetExceeded) as excinfo:
+            budget.check([0.01, 0.06, 0.2], 'GET /users')
+        assert str(excinfo.value) == ('GET /users p50 latency over 3 runs '
+                                      'was 60.0ms, over its budget of 50ms')
+
+    def test_read_from_raml(self, test_raml):
+        root = test_raml('budget', parsed=True)
+        budget = root.resources['/users']['GET'].latency_budget
+        assert (budget.max_ms, budget.runs) == (50, 1)
+        budget = root.resources['/users/{username}']['GET'].latency_budget
+        assert (budget.max_ms, budget.percentile, budget.runs,
+                budget.warmup) == (20, 95, 10, 2)
+        assert root.resources['/users']['POST'].latency_budget is None
+
+    def test_budget_from_raml_used_by_autotests(self, test_raml, users_app):
+        from ra.dsl import Autotest
+        api = APISuite(test_raml('budget'), app=users_app())
+        Autotest(api)._genscope('/users', api.raml.resources['/users'])
+        scope = api.resource_scopes[0]
+        scope.scope_fn(scope)
+        builder = marks.get(scope.members['get'], 'req_builder')
+        assert builder.latency_budget.max_ms == 50
+        builder = marks.get(scope.members['post'], 'req_builder')
+        assert builder.latency_budget is None
+
+    def test_exceeded(self, api, users_app, declare_tests):
+        api = APISuite(api.raml_path, app=users_app(delay=0.02))
+        builder, = declare_tests(api, 'get', max_latency_ms=5)
+        with pytest.raises(timing.LatencyBudgetExceeded):
+            builder.build()()
+
+    def test_repeated_runs_with_warmup(self, api, users_app,
+                                       declare_tests):
+        calls = []
+        api = APISuite(api.raml_path, app=users_app(calls=calls))
+        budget = timing.LatencyBudget(1000, percentile=95, runs=5, warmup=2)
+        get, = declare_tests(api, 'get', latency_budget=budget)
+        req = get.build()
+        resp = req()
+        assert len(calls) == 7
+        assert len(req.timings) == 7
+        assert resp.json == [{'username': 'earl'}]
+
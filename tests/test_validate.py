@@ -0,0 +1,169 @@
+import io
+import jsonschema
+import pytest
+from ra import raml
+from ra.validate import (
+    RAMLValidator,
+    RAMLValidationError,
+    SampleItems,
+    iter_json_array,
+)
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, json=None, headers=None, body=None):
+        self.status_code = status_code
+        self.json = json
+        self.headers = headers or {}
+        self.body = body
+
+
+@pytest.fixture(scope='module')
+def parsed(test_raml):
+    return test_raml('validation', parsed=True)
+
+
+class TestCompiledSchemas:
+    def test_validators_compiled_on_parse(self, parsed):
+        response = parsed.resources['/users']['GET'].responses[200]
+        validator = response.validators['application/json']
+        assert validator.is_valid([{'username': 'earl'}])
+        assert not validator.is_valid([{}])
+
+    def test_compile_schema_is_cached(self):
+        schema = {'type': 'object'}
+        assert raml.compile_schema(schema) is raml.compile_schema(
+            {'type': 'object'})
+
+    def test_invalid_schema_raises_on_parse(self):
+        with pytest.raises(jsonschema.SchemaError):
+            raml.compile_schema({'type': 'not-a-type'})
+
+
+class TestValidateBody:
+    def test_valid_body(self, parsed):
+        node = parsed.resources['/users']['POST']
+        resp = FakeResponse(201, json={'username': 'earl'})
+        RAMLValidator(resp, node).validate_body()
+
+    def test_invalid_body(self, parsed):
+        node = parsed.resources['/users']['POST']
+        resp = FakeResponse(201, json={'name': 'earl'})
+        with pytest.raises(jsonschema.ValidationError):
+            RAMLValidator(resp, node).validate_body()
+
+    def test_undeclared_status(self, parsed):
+        node = parsed.resources['/users']['POST']
+        resp = FakeResponse(400, json={'error': 'bad'})
+        RAMLValidator(resp, node).validate_body()
+
+
+class TestStreamingValidation:
+    @pytest.fixture
+    def node(self, parsed):
+        return parsed.resources['/users']['GET']
+
+    def validator(self, node, body):
+        # json=None would fail validation if the whole body was used
+        resp = FakeResponse(200, json=None, body=body)
+        return RAMLValidator(resp, node, stream_threshold=0)
+
+    def test_iter_json_array(self):
+        body = b' [ {"a": [1, 2]}, 12345, "x" , null ] '
+        for chunk_size in (1, 4, 1024):
+            items = iter_json_array(io.BytesIO(body), chunk_size=chunk_size)
+            assert list(items) == [{'a': [1, 2]}, 12345, 'x', None]
+
+    def test_iter_json_array_not_array(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.BytesIO(b'{"a": 1}')))
+
+    def test_valid_stream(self, node):
+        body = b'[{"username": "earl"}, {"username": "joe"}]'
+        self.validator(node, body).validate_body()
+
+    def test_invalid_item(self, node):
+        body = b'[{"username": "earl"}, {"username": 1}]'
+        with pytest.raises(jsonschema.ValidationError):
+            self.validator(node, body).validate_body()
+
+
+class TestSampleItems:
+    @pytest.fixture
+    def node(self, parsed):
+        return parsed.resources['/users']['GET']
+
+    def body(self, invalid_at=None, size=1000):
+        items = [{'username': 'user{}'.format(i)} for i in range(size)]
+        if invalid_at is not None:
+            items[invalid_at] = {}
+        return items
+
+    def test_samples_items(self, node):
+        validator = RAMLValidator(FakeResponse(200, json=self.body()), node)
+        validator.validate(SampleItems(first=10, rate=0.1, seed=1,
+                                       parts=['body']))
+        validated, total = validator.sampling
+        assert total == 1000
+        assert 10 < validated < 300
+
+    def test_sampling_is_seeded(self, node):
+        policy = SampleItems(first=10, rate=0.1, seed=1, parts=['body'])
+        counts = set()
+        for _ in range(2):
+            validator = RAMLValidator(FakeResponse(200, json=self.body()),
+                                      node)
+            validator.validate(policy)
+            counts.add(validator.sampling)
+        assert len(counts) == 1
+
+    def test_first_items_always_validated(self, node):
+        resp = FakeResponse(200, json=self.body(invalid_at=5))
+        policy = SampleItems(first=10, rate=0, parts=['body'])
+        with pytest.raises(jsonschema.ValidationError):
+            RAMLValidator(resp, node).validate(policy)
+
+    def test_unsampled_items_skipped(self, node):
+        resp = FakeResponse(200, json=self.body(invalid_at=500))
+        validator = RAMLValidator(resp, node)
+        validator.validate(SampleItems(first=10, rate=0, parts=['body']))
+        assert validator.sampling == (10, 1000)
+
+
+class TestValidateHeaders:
+    @pytest.fixture
+    def node(self, parsed):
+        return parsed.resources['/users']['GET']
+
+    def test_header_plan_compiled_on_parse(self, node):
+        plan = node.responses[200].header_plan
+        checks = {check.key: check for check in plan}
+        assert checks['x-total-count'].required
+        assert checks['x-total-count'].convert is int
+        assert not checks['x-cursor'].required
+
+    def test_valid_headers(self, node):
+        resp = FakeResponse(200, headers={'x-total-count': '3',
+                                          'X-Cursor': 'abc1'})
+        RAMLValidator(resp, node).validate_headers()
+
+    def test_missing_required_header(self, node):
+        resp = FakeResponse(200, headers={'X-Cursor': 'abc1'})
+        with pytest.raises(RAMLValidationError):
+            RAMLValidator(resp, node).validate_headers()
+
+    def test_wrong_header_type(self, node):
+        resp = FakeResponse(200, headers={'X-Total-Count': 'many'})
+        with pytest.raises(RAMLValidationError):
+            RAMLValidator(resp, node).validate_headers()
+
+    def test_header_constraint(self, node):
+        resp = FakeResponse(200, headers={'X-Total-Count': '-1'})
+        with pytest.raises(jsonschema.ValidationError):
+            RAMLValidator(resp, node).validate_headers()
+
+    def test_header_pattern(self, node):
+        resp = FakeResponse(200, headers={'X-Total-Count': '1',
+                                          'X-Cursor': 'NOPE'})
+        with pytest.raises(jsonschema.ValidationError):
+            RAMLValidator(resp, node).validate_headers()